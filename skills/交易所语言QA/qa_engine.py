@@ -9,20 +9,56 @@
 
 用法:
   python qa_engine.py scan --lang 越语 --files app.csv h5.csv web.csv agent.csv
+  python qa_engine.py scan --lang 越语 --shard 1/4 --files app.csv h5.csv web.csv agent.csv
+  python qa_engine.py scan --lang 越语 --baseline old/*.csv --files app.csv h5.csv web.csv agent.csv
+  python qa_engine.py scan --lang 越语 --sample 2000 --files app.csv h5.csv web.csv agent.csv
+  python qa_engine.py scan --lang 越语 --watch 共享目录/
+  python qa_engine.py merge --lang 越语 --parts 越语问题清单.part*of4.json
   python qa_engine.py fix --lang 越语 --issues 越南语问题清单.csv --files app.csv h5.csv
   python qa_engine.py verify --lang 越语 --files app.csv h5.csv web.csv agent.csv
+  python qa_engine.py equiv --lang 越语 --reference qa_engine_old.py --files app.csv h5.csv web.csv agent.csv
+
+库调用（术语表只加载一次，进程内反复扫描）:
+  engine = QAEngine('越语', terminology_file='术语表/越南语.md', verbose=False)
+  for issue in engine.scan_rows(rows): ...
+  issues = engine.scan_columns(sources, targets, keys)
+  engine.scan(rows, sinks=[csv_sink('越语问题清单.csv')])
 """
 
 import csv
+import io
 import re
 import sys
 import os
+import gzip
+import queue
+import threading
 import argparse
 import json
+import math
+import random
+import hashlib
+import importlib.machinery
+import importlib.util
+import sqlite3
+import time
+import unicodedata
 from collections import defaultdict, Counter
+from itertools import zip_longest
+from contextlib import contextmanager, redirect_stdout
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import resource  # 峰值内存；Windows 无此模块
+except ImportError:
+    resource = None
+
+try:
+    import zstandard  # 可选依赖：读写 .csv.zst
+except ImportError:
+    zstandard = None
+
 # ============================================================
 # 1. 中文检测
 # ============================================================
@@ -51,17 +87,40 @@ FULLWIDTH_MAP = {
     '、': ',', '。': '.', '《': '<', '》': '>',
     '丨': '|',
 }
-RE_FULLWIDTH = re.compile('[' + re.escape(''.join(FULLWIDTH_MAP.keys())) + ']')
+FULLWIDTH_CHARS = frozenset(FULLWIDTH_MAP)
+
+class _FullwidthTable(dict):
+    """str.translate 映射表：未列出的字符首次查到时记为映射到自身，
+    之后整段文本的逐字符查表全部直接命中（避免每个字符走一次查找失败）"""
+
+    def __missing__(self, code):
+        self[code] = code
+        return code
+
+# 一张表完成全部替换（含多字符的 … → ...），扫描、修正、术语表加载共用
+FULLWIDTH_TABLE = _FullwidthTable(str.maketrans(FULLWIDTH_MAP))
+
+def normalize_fullwidth(text):
+    """返回 (半角化文本, 是否有改动)：先用集合判定有无全角字符，有才做一次 translate"""
+    if FULLWIDTH_CHARS.isdisjoint(text):
+        return text, False
+    return text.translate(FULLWIDTH_TABLE), True
+
+def normalize_fullwidth_column(values):
+    """整列半角化，返回 (清理后的列表, 有改动的下标列表)；无全角字符的单元格原样保留"""
+    values = list(values)  # 可能是生成器 / dict_values：先物化，下面要遍历两次
+    clean = FULLWIDTH_CHARS.isdisjoint
+    changed = [i for i, value in enumerate(values) if not clean(value)]
+    for i in changed:
+        values[i] = values[i].translate(FULLWIDTH_TABLE)
+    return values, changed
 
 def replace_fullwidth(text):
     """替换全角标点为半角"""
-    result = text
-    for fw, hw in FULLWIDTH_MAP.items():
-        result = result.replace(fw, hw)
-    return result
+    return normalize_fullwidth(text)[0]
 
 def has_fullwidth(text):
-    return bool(RE_FULLWIDTH.search(str(text)))
+    return not FULLWIDTH_CHARS.isdisjoint(str(text))
 
 # ============================================================
 # 3. Mojibake检测
@@ -72,23 +131,91 @@ def has_mojibake(text):
     return bool(RE_MOJIBAKE.search(str(text)))
 
 # ============================================================
-# 4. HTML标签检测
+# 4. 占位符与HTML标签词法
 # ============================================================
-def has_broken_html(text):
+# 单遍词法扫描：一个正则同时提取插值占位符、HTML标签、HTML实体
+# {0} {name} ${name} {{amount}} %s %1$s %.2f %@ <br> </b> <a href=..> &nbsp; &#160;
+# printf 占位符后不能紧跟字母数字（含越南语字母），否则「50%sức mua」会被误读为 %s
+RE_MARKUP_TOKEN = re.compile(
+    r'(?P<ph>\{\{\s*[A-Za-z0-9_.\-]+\s*\}\}'
+    r'|\$?\{\s*[A-Za-z0-9_.\-]*\s*\}'
+    r'|%(?:\d+\$)?[-+0#]*\d*(?:\.\d+)?(?:ll|l|h)?[sdifuxX@](?![0-9A-Za-zÀ-ỹ]))'
+    r'|(?P<pct>%%)'
+    r'|(?P<tag><(?P<slash>/?)\s*(?P<name>[A-Za-z][A-Za-z0-9]*)\b[^<>]*>)'
+    r'|(?P<bad></?\s*(?P<bad_name>[A-Za-z][A-Za-z0-9]*))'
+    r'|(?P<ent>&(?:[A-Za-z][A-Za-z0-9]{1,31}|#\d{1,7}|#[xX][0-9A-Fa-f]{1,6});)'
+)
+
+# 只把真实HTML/富文本标签当作标签，避免 《Hướng dẫn》→<Hướng dẫn> 之类误判
+HTML_TAGS = {
+    'a', 'abbr', 'b', 'big', 'blockquote', 'br', 'code', 'color', 'del', 'div', 'em',
+    'font', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'input', 'ins',
+    'label', 'li', 'link', 'meta', 'ol', 'p', 'pre', 's', 'size', 'small', 'span',
+    'strike', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr',
+    'u', 'ul',
+}
+# 自闭合标签不参与开闭配对
+VOID_TAGS = {'br', 'hr', 'img', 'input', 'meta', 'link'}
+
+def tokenize_markup(text):
+    """单遍提取标记，返回 (tokens, broken)
+    tokens: Counter{规范化标记: 次数}，用于源/目标多重集比较
+    broken: [HTML结构问题描述]，如 未闭合<b> / 多余</b> / 残缺标签<br
+    """
+    tokens = Counter()
+    broken = []
+    stack = []
     t = str(text)
-    # 检查未闭合的标签
-    open_tags = re.findall(r'<([a-zA-Z]+)[^>]*(?<!/)>', t)
-    close_tags = re.findall(r'</([a-zA-Z]+)>', t)
-    # 自闭合标签不算
-    self_closing = {'br', 'hr', 'img', 'input', 'meta', 'link'}
-    open_filtered = [tag.lower() for tag in open_tags if tag.lower() not in self_closing]
-    close_filtered = [tag.lower() for tag in close_tags]
-    if len(open_filtered) != len(close_filtered):
-        return True
-    # 检查 <br 没有 > 的情况
-    if re.search(r'<br(?!\s*>|/>|\s)', t):
-        return True
-    return False
+    if not any(c in t for c in '{%<&'):
+        return tokens, broken
+
+    for m in RE_MARKUP_TOKEN.finditer(t):
+        kind = m.lastgroup
+        if kind == 'ph':
+            tokens[''.join(m.group('ph').split())] += 1
+        elif kind == 'ent':
+            tokens[m.group('ent')] += 1
+        elif kind == 'tag':
+            name = m.group('name').lower()
+            if name not in HTML_TAGS:
+                continue
+            if m.group('slash'):
+                tokens[f'</{name}>'] += 1
+                if stack and stack[-1] == name:
+                    stack.pop()
+                elif name in stack:
+                    # 交错嵌套：<b><i></b></i>
+                    stack.remove(name)
+                    broken.append(f'标签交错</{name}>')
+                else:
+                    broken.append(f'多余</{name}>')
+            else:
+                tokens[f'<{name}>'] += 1
+                if name not in VOID_TAGS and not m.group('tag').endswith('/>'):
+                    stack.append(name)
+        elif kind == 'bad':
+            name = m.group('bad_name').lower()
+            if name in HTML_TAGS:
+                broken.append(f'残缺标签{m.group("bad")}')
+
+    broken.extend(f'未闭合<{name}>' for name in stack)
+    return tokens, broken
+
+def diff_markup(src_tokens, tgt_tokens):
+    """比较源/目标标记多重集，返回差异描述（空字符串=一致）"""
+    if src_tokens == tgt_tokens:
+        return ''
+    missing = src_tokens - tgt_tokens
+    extra = tgt_tokens - src_tokens
+    parts = []
+    if missing:
+        parts.append('缺失: ' + ', '.join(f'{tok}×{n}' for tok, n in sorted(missing.items())))
+    if extra:
+        parts.append('多余: ' + ', '.join(f'{tok}×{n}' for tok, n in sorted(extra.items())))
+    return '; '.join(parts)
+
+def has_broken_html(text):
+    return bool(tokenize_markup(text)[1])
 
 # ============================================================
 # 5. 术语表加载
@@ -137,11 +264,13 @@ def load_terminology(terminology_file):
                 zh = cells[1].strip()
                 standard = cells[3].strip()
                 if zh and standard:
-                    terms[zh] = replace_fullwidth(standard)
+                    terms[zh] = standard
             except (ValueError, IndexError):
                 pass
 
-    return terms
+    # 标准翻译整列半角化
+    standards, _ = normalize_fullwidth_column(terms.values())
+    return dict(zip(terms, standards))
 
 def load_override_terms(terminology_file):
     """加载龙老师覆盖术语（最高优先级）"""
@@ -428,6 +557,124 @@ def check_wrong_term(target, source):
         return True, fixed, '; '.join(issues)
     return False, target, ''
 
+# ============================================================
+# 6.1 去声调折叠匹配（--fold-diacritics）
+# ============================================================
+# 译文丢声调（"Hop dong tuong lai"）或 NFD/NFC 组合方式不同时，精确匹配会漏掉禁止术语。
+# 折叠模式：目标文本 NFC 规范化一次 → 逐字折叠为去声调小写形式（保留到 NFC 原文的偏移映射）
+# → 预编译的禁止术语正则在折叠文本上跑一遍 → 在原文偏移处替换。
+
+class _FoldTable(dict):
+    """str.translate 用的惰性折叠表：码位 → 去声调小写字符串（组合符号 → 空串）"""
+
+    def __init__(self):
+        super().__init__()
+        self.expanding = set()  # 折叠后多于1个字符的码位（如 İ）
+
+    def __missing__(self, code):
+        ch = chr(code)
+        base = ''.join(c for c in unicodedata.normalize('NFD', ch) if not unicodedata.combining(c))
+        folded = base.replace('đ', 'd').replace('Đ', 'D').lower()
+        if len(folded) > 1:
+            self.expanding.add(code)
+        self[code] = folded
+        return folded
+
+FOLD_TABLE = _FoldTable()
+
+def fold_text(text):
+    """返回 (nfc, folded, offsets)
+    offsets[i] 为 folded[i] 在 nfc 中的位置，末尾附 len(nfc) 哨兵；
+    逐字一一对应时 offsets 为 None（恒等映射，省去建表）
+    """
+    nfc = unicodedata.normalize('NFC', str(text))
+    folded = nfc.translate(FOLD_TABLE)
+    # 从未见过扩展字符时，长度相等即说明没有删除任何组合符号
+    if len(folded) == len(nfc) and not FOLD_TABLE.expanding:
+        return nfc, folded, None
+    offsets = []
+    for i, ch in enumerate(nfc):
+        offsets.extend([i] * len(FOLD_TABLE[ord(ch)]))
+    offsets.append(len(nfc))
+    return nfc, folded, offsets
+
+# 折叠后需要额外排除的语境：{折叠禁止词: 折叠排除词}
+FOLDED_GUARDS = {'don hang': 'hoa don'}  # "hóa đơn" 中的 "đơn" 不替换
+
+def _folded_key_regex(key):
+    # 折叠后短词更易误中（gấp U / gấp ủy），字母数字边界处要求整词
+    left = r'(?<!\w)' if key[0].isalnum() else ''
+    right = r'(?!\w)' if key[-1].isalnum() else ''
+    return left + re.escape(key) + right
+
+def build_folded_matcher(rules):
+    """把 WRONG_TERM_RULES 编译为折叠文本上的单个正则
+    返回 (regex, {折叠词: [(pattern, replacement, ctx_fn)]}, [(折叠词, 单词正则)] 按长度降序)
+    """
+    by_key = defaultdict(list)
+    for pattern, replacement, context_fn in rules:
+        by_key[fold_text(pattern)[1]].append((pattern, replacement, context_fn))
+    keys = sorted(by_key, key=len, reverse=True)
+    regex = re.compile('|'.join(_folded_key_regex(k) for k in keys))
+    key_regexes = [(k, re.compile(_folded_key_regex(k))) for k in keys]
+    return regex, dict(by_key), key_regexes
+
+FOLDED_WRONG_TERM_RE, FOLDED_WRONG_TERMS, FOLDED_WRONG_TERM_KEYS = build_folded_matcher(WRONG_TERM_RULES)
+
+def _pick_folded_rule(key, source, folded):
+    guard = FOLDED_GUARDS.get(key)
+    if guard and guard in folded:
+        return None
+    for pattern, replacement, context_fn in FOLDED_WRONG_TERMS[key]:
+        if context_fn(source):
+            return replacement
+    return None
+
+def check_wrong_term_folded(target, source):
+    """去声调/组合方式无关的禁止术语检测，返回值同 check_wrong_term"""
+    if not target:
+        return False, target, ''
+
+    nfc, folded, offsets = fold_text(target)
+    pieces = []
+    issues = []
+    last = 0
+    pos = 0
+
+    while True:
+        m = FOLDED_WRONG_TERM_RE.search(folded, pos)
+        if not m:
+            break
+        start, end = m.start(), m.end()
+        replacement = _pick_folded_rule(m.group(), source, folded)
+        if replacement is None:
+            # 最长候选语境不符：同一位置退回更短的禁止词
+            for key, key_re in FOLDED_WRONG_TERM_KEYS:
+                if len(key) >= end - start:
+                    continue
+                km = key_re.match(folded, start)
+                if km:
+                    replacement = _pick_folded_rule(key, source, folded)
+                    if replacement is not None:
+                        end = km.end()
+                        break
+        if replacement is None:
+            pos = start + 1
+            continue
+
+        o_start = offsets[start] if offsets else start
+        o_end = offsets[end] if offsets else end
+        pieces.append(nfc[last:o_start])
+        pieces.append(replacement)
+        issues.append(f'{nfc[o_start:o_end]}→{replacement}')
+        last = o_end
+        pos = end
+
+    if issues:
+        pieces.append(nfc[last:])
+        return True, ''.join(pieces), '; '.join(issues)
+    return False, target, ''
+
 # ============================================================
 # 7. 空白检测
 # ============================================================
@@ -473,11 +720,125 @@ def check_capitalization(text):
         return True, fixed
     return False, t
 
+# ============================================================
+# 8.1 显示宽度（TEXT_OVERFLOW）
+# ============================================================
+# 越南语/韩语译文常比中文源宽 2-3 倍，短按钮/标签会被截断。
+# 宽度单位为"半列"（拉丁字母=2，汉字/谚文/全角=4，窄字形=1，组合声调符号=0），
+# 按码位区间预先定好各文字宽度，str.translate 把每个字符映射为 chr(宽度)，
+# 再 encode 后对字节求和——整串在 C 层完成，不做逐字 Python 循环。
+WIDTH_RANGES = [
+    (0x0300, 0x036F, 0),  # 组合附加符号（越南语 NFD 声调：̀ ́ ̃ ̉ ̣）
+    (0x1100, 0x115F, 4),  # 谚文字母（初声）
+    (0x200B, 0x200F, 0),  # 零宽字符
+    (0x2E80, 0x303E, 4),  # CJK 部首、CJK 标点
+    (0x3041, 0x33FF, 4),  # 假名、注音、CJK 兼容
+    (0x3400, 0x4DBF, 4),  # CJK 扩展A
+    (0x4E00, 0x9FFF, 4),  # CJK 统一汉字
+    (0xAC00, 0xD7A3, 4),  # 谚文音节
+    (0xF900, 0xFAFF, 4),  # CJK 兼容汉字
+    (0xFE30, 0xFE4F, 4),  # CJK 兼容形式
+    (0xFF01, 0xFF60, 4),  # 全角 ASCII
+    (0xFFE0, 0xFFE6, 4),  # 全角符号
+]
+NARROW_GLYPHS = set(" !'(),./:;I[]`fijlrt|ı")
+WIDE_GLYPHS = set('%@MWmw')
+
+class _WidthTable(dict):
+    """str.translate 用的惰性宽度表：码位 → chr(半列宽度)"""
+
+    def __missing__(self, code):
+        for start, end, width in WIDTH_RANGES:
+            if start <= code <= end:
+                break
+        else:
+            ch = chr(code)
+            if unicodedata.combining(ch):
+                width = 0
+            elif unicodedata.east_asian_width(ch) in ('W', 'F'):
+                width = 4
+            elif ch in NARROW_GLYPHS:
+                width = 1
+            elif ch in WIDE_GLYPHS:
+                width = 3
+            else:
+                # 越南语预组合字母（ế ữ ộ ...）按基字母算
+                base = unicodedata.normalize('NFD', ch)[0]
+                width = 1 if base in NARROW_GLYPHS else 3 if base in WIDE_GLYPHS else 2
+        self[code] = chr(width)
+        return self[code]
+
+WIDTH_TABLE = _WidthTable()
+
+def display_width(text):
+    """渲染宽度（列，拉丁字母≈1，汉字≈2），不计占位符与HTML标签"""
+    if '<' in text or '{' in text or '%' in text or '&' in text:
+        text = RE_MARKUP_TOKEN.sub('', text)
+    return sum(text.translate(WIDTH_TABLE).encode('latin-1')) / 2
+
+# 平台: (译文/源文本宽度上限倍数, 宽度下限列数——不超过此宽度不报)
+# 按术语表标准译文校准：越南语 977 条短文案标准译文中位 1.7 倍、p99 3.5 倍，
+# APP/H5 预算下约 1% 超出，Web/代理后台几乎为 0（韩语、英语术语表全部不超出）
+OVERFLOW_BUDGETS = {
+    'APP': (3.0, 16),
+    'H5': (3.0, 16),
+    'Web': (3.5, 16),
+    '代理后台': (4.0, 20),
+}
+OVERFLOW_DEFAULT_BUDGET = (3.5, 16)
+OVERFLOW_MAX_SOURCE_COLS = 20  # 只检查短文案（≤10个汉字：按钮/标签/标题），长句会换行
+
+def check_text_overflow(source, text, file_label):
+    """检查译文是否超出所在平台的宽度预算，返回 (has_issue, detail)"""
+    source_width = display_width(source)
+    if not source_width or source_width > OVERFLOW_MAX_SOURCE_COLS:
+        return False, ''
+    ratio_limit, min_cols = OVERFLOW_BUDGETS.get(file_label, OVERFLOW_DEFAULT_BUDGET)
+    width = display_width(text)
+    if width <= max(source_width * ratio_limit, min_cols):
+        return False, ''
+    return True, (f'显示宽度{width:g}列，源文本{source_width:g}列'
+                  f'（{width / source_width:.1f}倍，{file_label}上限{ratio_limit:g}倍）')
+
 # ============================================================
 # 9. 核心扫描函数
 # ============================================================
-def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbidden, fragments, source_file):
-    """扫描单行，返回问题列表 [(priority, type, current, suggestion, detail)]"""
+# 术语表标准翻译的预处理结果 {原标准: (全角归一后的标准, 是否含禁止术语)}，每条标准只算一次
+_STANDARD_CACHE = {}
+CACHE_STATS = Counter()  # 缓存查询/未命中次数（--metrics 输出命中率）
+
+def compile_standard(standard):
+    CACHE_STATS['standard_lookups'] += 1
+    compiled = _STANDARD_CACHE.get(standard)
+    if compiled is None:
+        CACHE_STATS['standard_misses'] += 1
+        fixed = replace_fullwidth(standard)
+        lowered = fixed.lower()
+        has_forbidden = any(pattern.lower() in lowered and pattern.lower() != replacement.lower()
+                            for pattern, replacement, ctx_fn in WRONG_TERM_RULES)
+        compiled = _STANDARD_CACHE[standard] = (fixed, has_forbidden)
+    return compiled
+
+def markup_issues(source, target, text, with_html=True):
+    """PLACEHOLDER_MISMATCH / BROKEN_HTML：源与 text 各做一次词法扫描，两项检查共用结果"""
+    issues = []
+    src_tokens, _ = tokenize_markup(source)
+    tgt_tokens, html_broken = tokenize_markup(text)
+    ph_diff = diff_markup(src_tokens, tgt_tokens)
+    if ph_diff:
+        issues.append(('P0', 'PLACEHOLDER_MISMATCH', target, '', ph_diff))
+    if with_html and html_broken:
+        issues.append(('P2', 'BROKEN_HTML', target, '', 'HTML标签损坏: ' + ', '.join(html_broken)))
+    return issues
+
+def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbidden, fragments, source_file,
+             fold_diacritics=False, max_priority='P2'):
+    """扫描单行，返回问题列表 [(priority, type, current, suggestion, detail)]
+    fold_diacritics=True 时禁止术语按去声调折叠文本匹配
+    max_priority='P0'/'P1' 时只检测到该优先级为止（门禁模式），结果与完整扫描中对应优先级的问题一致
+    PLACEHOLDER_MISMATCH / BROKEN_HTML 在各模式下都检查同一文本：P0 片段修复 + 全角半角化后、
+    术语/空白/大小写改写前的译文
+    """
     issues = []
 
     target = str(row.get(target_col, '')).strip() if row.get(target_col) else ''
@@ -531,14 +892,21 @@ def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbid
             working_target = issue[3]
             break
 
+    if max_priority == 'P0':
+        # 标记检测文本含全角替换（《》→<>），提前套用即与完整扫描一致
+        issues.extend(markup_issues(source, target, replace_fullwidth(working_target), with_html=False))
+        return issues
+
     # === P1: FULLWIDTH_PUNCTUATION ===
-    if has_fullwidth(working_target):
-        fixed = replace_fullwidth(working_target)
+    fixed, fullwidth_changed = normalize_fullwidth(working_target)
+    if fullwidth_changed:
         issues.append(('P1', 'FULLWIDTH_PUNCTUATION', target, fixed, '全角标点'))
         working_target = fixed
+    markup_text = working_target  # 标记检测文本，门禁模式与完整扫描共用
 
     # === P1: WRONG_TERM ===
-    has_wt, wt_fixed, wt_detail = check_wrong_term(working_target, source)
+    wrong_term_fn = check_wrong_term_folded if fold_diacritics else check_wrong_term
+    has_wt, wt_fixed, wt_detail = wrong_term_fn(working_target, source)
     if has_wt:
         issues.append(('P1', 'WRONG_TERM', target, wt_fixed, wt_detail))
         working_target = wt_fixed
@@ -548,6 +916,7 @@ def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbid
     # 2) 用source短文本精确匹配
     matched_standard = None
     match_source = None
+    is_standard = False  # 译文即术语表标准翻译
 
     # 先查覆盖表
     if lang_key in overrides:
@@ -565,19 +934,20 @@ def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbid
         match_source = source
 
     if matched_standard:
-        matched_standard = replace_fullwidth(matched_standard)
         # 跳过：标准翻译本身包含禁止术语（WRONG_TERM会处理）
-        standard_has_forbidden = False
-        for pattern, replacement, ctx_fn in WRONG_TERM_RULES:
-            if pattern.lower() in matched_standard.lower() and pattern.lower() != replacement.lower():
-                standard_has_forbidden = True
-                break
+        matched_standard, standard_has_forbidden = compile_standard(matched_standard)
         # Normalize: strip + collapse whitespace + lowercase for comparison
         def _norm(s): return ' '.join(s.lower().split())
-        if not standard_has_forbidden and _norm(working_target) != _norm(matched_standard) and _norm(target) != _norm(matched_standard):
+        is_standard = not standard_has_forbidden and (_norm(working_target) == _norm(matched_standard)
+                                                      or _norm(target) == _norm(matched_standard))
+        if not standard_has_forbidden and not is_standard:
             issues.append(('P1', 'TERMINOLOGY_MISMATCH', target, matched_standard,
                            f'{match_source}: 当前「{working_target}」应为「{matched_standard}」'))
 
+    if max_priority == 'P1':
+        issues.extend(markup_issues(source, target, markup_text, with_html=False))
+        return issues
+
     # === P2: WHITESPACE ===
     if has_whitespace_issue(working_target):
         fixed = fix_whitespace(working_target)
@@ -591,9 +961,15 @@ def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbid
         issues.append(('P2', 'CAPITALIZATION', target, cap_fixed, '大小写规范'))
         working_target = cap_fixed
 
-    # === P2: BROKEN_HTML ===
-    if has_broken_html(working_target):
-        issues.append(('P2', 'BROKEN_HTML', target, '', 'HTML标签损坏'))
+    # === P2: TEXT_OVERFLOW ===
+    # 译文就是术语表规定的标准翻译时不报（否则与 TERMINOLOGY_MISMATCH 互相矛盾）
+    overflow, overflow_detail = (False, '') if is_standard else \
+        check_text_overflow(source, working_target, get_file_label(source_file))
+    if overflow:
+        issues.append(('P2', 'TEXT_OVERFLOW', target, '', overflow_detail))
+
+    # === P0: PLACEHOLDER_MISMATCH / P2: BROKEN_HTML ===
+    issues.extend(markup_issues(source, target, markup_text))
 
     # 合并修正：所有issue的建议修正统一为最终累积修正结果
     if issues and working_target != target:
@@ -609,9 +985,12 @@ def scan_row(row, target_col, source_col, lang_key_col, terms, overrides, forbid
 # ============================================================
 # 10. INCONSISTENCY检测（跨行）
 # ============================================================
-def check_inconsistency(all_rows, target_col, source_col, terms, overrides):
-    """检查同一源文本多种翻译"""
-    source_translations = defaultdict(lambda: defaultdict(list))  # {source: {target: [row_ids]}}
+def collect_translations(all_rows, target_col, source_col, source_translations=None):
+    """聚合 {source: {target: [(row_id, file_name, pos)]}}，可跨分片合并
+    传入 source_translations 时在其上累加（流水线逐批聚合）
+    """
+    if source_translations is None:
+        source_translations = defaultdict(lambda: defaultdict(list))
 
     for row in all_rows:
         source = str(row.get(source_col, '')).strip()
@@ -620,27 +999,33 @@ def check_inconsistency(all_rows, target_col, source_col, terms, overrides):
         file_name = row.get('__source_file__', '')
 
         if source and target and has_chinese(source):
-            source_translations[source][target].append((row_id, file_name))
-
+            source_translations[source][target].append((row_id, file_name, row.get('__pos__')))
+
+    return source_translations
+
+def pick_standard(source, target_counts, terms, overrides):
+    """确定标准翻译：术语表标准优先（含禁止术语则放弃），否则取频率最高的译文"""
+    standard = overrides.get(source) or terms.get(source)
+    if standard:
+        standard, standard_has_forbidden = compile_standard(standard)
+        # 如果标准含禁止术语，放弃用术语表标准
+        if standard_has_forbidden:
+            standard = None
+    if not standard:
+        # 取频率最高的
+        standard = max(target_counts.keys(), key=lambda t: target_counts[t])
+    return standard
+
+def inconsistency_from_translations(source_translations, terms, overrides):
+    """根据聚合结果生成 INCONSISTENCY 问题"""
     issues = []
     for source, translations in source_translations.items():
         if len(translations) > 1:
-            # 确定标准翻译
-            standard = overrides.get(source) or terms.get(source)
-            if standard:
-                standard = replace_fullwidth(standard)
-                # 如果标准含禁止术语，放弃用术语表标准
-                for pattern, replacement, ctx_fn in WRONG_TERM_RULES:
-                    if pattern.lower() in standard.lower() and pattern.lower() != replacement.lower():
-                        standard = None
-                        break
-            if not standard:
-                # 取频率最高的
-                standard = max(translations.keys(), key=lambda t: len(translations[t]))
+            standard = pick_standard(source, {t: len(locs) for t, locs in translations.items()}, terms, overrides)
 
             for target, locations in translations.items():
                 if target.lower() != standard.lower() and target != standard:
-                    for row_id, file_name in locations:
+                    for row_id, file_name, pos in locations:
                         issues.append({
                             'row_id': row_id,
                             'file': file_name,
@@ -649,16 +1034,239 @@ def check_inconsistency(all_rows, target_col, source_col, terms, overrides):
                             'source': source,
                             'current': target,
                             'suggestion': standard,
-                            'detail': f'同源文本「{source}」有{len(translations)}种翻译，应统一为「{standard}」'
+                            'detail': f'同源文本「{source}」有{len(translations)}种翻译，应统一为「{standard}」',
+                            'pos': pos,
                         })
 
     return issues
 
+def check_inconsistency(all_rows, target_col, source_col, terms, overrides):
+    """检查同一源文本多种翻译"""
+    source_translations = collect_translations(all_rows, target_col, source_col)
+    return inconsistency_from_translations(source_translations, terms, overrides)
+
+# ============================================================
+# 10.1 跨平台语言标识一致性（KEY_DIVERGENCE）
+# ============================================================
+# 同一个语言标识在 APP/H5/Web/代理后台 应当对应同一源文本、同一译文。
+# 按语言标识做一次哈希连接：单遍建立 {key: {平台: 首次出现的行}}，
+# 每个 key 只保留各平台一条记录，内存与 key 数 × 平台数成正比，不做两两嵌套比较。
+
+def collect_key_index(all_rows, target_col, source_col, lang_key_col, key_index=None):
+    """{lang_key: {平台: (source, target, row_id, filepath, pos)}}，可跨分片合并
+    传入 key_index 时在其上累加（流水线逐批聚合）
+    """
+    if key_index is None:
+        key_index = {}
+    if not lang_key_col:
+        return key_index
+
+    for row in all_rows:
+        lang_key = str(row.get(lang_key_col) or '').strip()
+        target = str(row.get(target_col) or '').strip()
+        if not lang_key or not target:
+            continue
+        filepath = row.get('__source_file__', '')
+        platforms = key_index.setdefault(lang_key, {})
+        platform = get_file_label(filepath)
+        if platform not in platforms:
+            source = str(row.get(source_col) or '').strip()
+            row_id = str(row.get('编号ID', '')).strip()
+            platforms[platform] = (source, target, row_id, filepath, row.get('__pos__'))
+
+    return key_index
+
+def _platform_order(platform):
+    return (FILE_ORDER.get(platform, 9), platform)
+
+def key_divergence_from_index(key_index, terms, overrides):
+    """按平台对比较同一语言标识的源文本与译文，返回 KEY_DIVERGENCE 问题"""
+    issues = []
+
+    def add(platform, entry, lang_key, suggestion, detail):
+        source, target, row_id, filepath, pos = entry
+        issues.append({
+            'file': platform,
+            'filepath': filepath,
+            'row_id': row_id,
+            'priority': 'P1',
+            'type': 'KEY_DIVERGENCE',
+            'lang_key': lang_key,
+            'current': target,
+            'suggestion': suggestion,
+            'detail': detail,
+            'source': source,
+            'pos': pos,
+        })
+
+    for lang_key, platforms in key_index.items():
+        if len(platforms) < 2:
+            continue
+        entries = sorted(platforms.items(), key=lambda kv: _platform_order(kv[0]))
+
+        # 1) 同一 key 源文本不同：key 复用错误，需开发处理，不给建议
+        source_counts = Counter(entry[0] for _, entry in entries)
+        if len(source_counts) > 1:
+            major = max(source_counts, key=lambda s: source_counts[s])
+            for platform, entry in entries:
+                if entry[0] == major:
+                    continue
+                pairs = [f'{platform}↔{other}' for other, e in entries if e[0] != entry[0]]
+                add(platform, entry, lang_key, '',
+                    f'语言标识「{lang_key}」源文本不一致({", ".join(pairs)}): 「{entry[0]}」≠「{major}」')
+
+        # 2) 同 key 同源文本，译文不同
+        by_source = defaultdict(list)
+        for platform, entry in entries:
+            by_source[entry[0]].append((platform, entry))
+        for source, group in by_source.items():
+            target_counts = Counter(entry[1] for _, entry in group)
+            if len(group) < 2 or len(target_counts) < 2:
+                continue
+            standard = pick_standard(source, target_counts, terms, overrides)
+            for platform, entry in group:
+                target = entry[1]
+                if target.lower() == standard.lower() or target == standard:
+                    continue
+                pairs = [f'{platform}↔{other}' for other, e in group if e[1] != target]
+                add(platform, entry, lang_key, standard,
+                    f'语言标识「{lang_key}」跨平台译文不一致({", ".join(pairs)})，应统一为「{standard}」')
+
+    return issues
+
+# ============================================================
+# 10.2 翻译记忆（TM）建议
+# ============================================================
+# 为 EMPTY / UNTRANSLATED_COPY / CONTAINS_CHINESE 行从同批导出的干净译文中找最相似的源文本，
+# 给出其译文作为建议修正。相似度 = 中文字符 bigram 集合的 Dice 系数。
+TM_MIN_SCORE = 0.8
+TM_EPSILON = 1e-9  # 阈值比较容差：Dice 恰好等于阈值（如 4/5 = 0.8）时不因浮点误差被过滤
+TM_TYPES = ('EMPTY', 'UNTRANSLATED_COPY', 'CONTAINS_CHINESE')
+
+class TranslationMemory:
+    """中文源文本 n-gram 倒排索引
+
+    倒排表按 (gram, 条目gram数) 分桶：查询只访问长度过滤允许的桶，
+    并用前缀过滤只遍历最稀有的几个 gram，百万条目下单次查询仍在亚毫秒级。
+    """
+
+    def __init__(self, n=2):
+        self.n = n
+        self.sources = []
+        self.targets = []
+        self.grams = []
+        self.exact = {}                  # {源文本: 条目号}
+        self.index = defaultdict(list)   # {(gram, gram数): [条目号]}
+        self.df = Counter()              # {gram: 条目数}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def _grams(self, text):
+        t = ''.join(str(text).split())
+        if len(t) <= self.n:
+            return frozenset([t]) if t else frozenset()
+        return frozenset(t[i:i + self.n] for i in range(len(t) - self.n + 1))
+
+    def add(self, source, target):
+        if source in self.exact:
+            return
+        grams = self._grams(source)
+        if not grams:
+            return
+        entry = len(self.sources)
+        self.sources.append(source)
+        self.targets.append(target)
+        self.grams.append(grams)
+        self.exact[source] = entry
+        size = len(grams)
+        for g in grams:
+            self.index[(g, size)].append(entry)
+            self.df[g] += 1
+
+    @classmethod
+    def from_translations(cls, source_translations, dirty_positions):
+        """用聚合结果中无行内问题的位置构建；同源多译取干净出现次数最多的译文"""
+        tm = cls()
+        for source, targets in source_translations.items():
+            best, best_count = None, 0
+            for target, locations in targets.items():
+                clean = sum(1 for loc in locations if loc[2] not in dirty_positions)
+                if clean > best_count:
+                    best, best_count = target, clean
+            if best:
+                tm.add(source, best)
+        return tm
+
+    def lookup(self, source, min_score=TM_MIN_SCORE):
+        """返回 (译文, 相似度, 匹配源文本)，没有足够相似的条目时返回 None"""
+        entry = self.exact.get(source)
+        if entry is not None:
+            return self.targets[entry], 1.0, source
+
+        grams = self._grams(source)
+        size = len(grams)
+        if not size:
+            return None
+
+        # 长度过滤：Dice ≥ t 要求对方 gram 数在 [size·t/(2-t), size·(2-t)/t]
+        lo = max(1, math.ceil(size * min_score / (2 - min_score) - TM_EPSILON))
+        hi = math.floor(size * (2 - min_score) / min_score + TM_EPSILON)
+        ordered = sorted(grams, key=lambda g: self.df.get(g, 0))
+
+        best = None  # (score, -entry)
+        for other_size in range(lo, hi + 1):
+            # 前缀过滤：重叠至少 m 个 gram 的条目必然命中最稀有的 size-m+1 个 gram 之一
+            min_overlap = math.ceil(min_score * (size + other_size) / 2 - TM_EPSILON)
+            seen = set()
+            for g in ordered[:max(size - min_overlap + 1, 0)]:
+                for entry in self.index.get((g, other_size), ()):
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    score = 2 * len(grams & self.grams[entry]) / (size + other_size)
+                    if score >= min_score - TM_EPSILON and (best is None or (score, -entry) > best):
+                        best = (score, -entry)
+
+        if best is None:
+            return None
+        entry = -best[1]
+        return self.targets[entry], best[0], self.sources[entry]
+
+def apply_tm_suggestions(all_issues, source_translations, min_score=TM_MIN_SCORE):
+    """为无可用译文的行填入翻译记忆建议，返回 (TM条目数, 建议数)"""
+    dirty_positions = {issue['pos'] for issue in all_issues if issue.get('pos') is not None}
+    tm = TranslationMemory.from_translations(source_translations, dirty_positions)
+
+    suggested = 0
+    cache = {}
+    for issue in all_issues:
+        if issue['type'] not in TM_TYPES or issue['suggestion'] or not issue.get('source'):
+            continue
+        source = issue['source']
+        if source not in cache:
+            cache[source] = tm.lookup(source, min_score)
+        hit = cache[source]
+        if hit:
+            target, score, matched = hit
+            issue['suggestion'] = target
+            issue['detail'] = f"{issue['detail']}; 翻译记忆{score:.0%}: 「{matched}」"
+            suggested += 1
+    return len(tm), suggested
+
 # ============================================================
 # 11. 主扫描流程
 # ============================================================
+_FILE_LABELS = {}  # {文件路径: 来源标签}，逐行检测与跨行聚合都会反复查询
+
 def get_file_label(filepath):
     """从文件名推断来源标签"""
+    label = _FILE_LABELS.get(filepath)
+    if label is None:
+        label = _FILE_LABELS[filepath] = _file_label(filepath)
+    return label
+
+def _file_label(filepath):
     name = os.path.basename(filepath).lower()
     if 'app' in name: return 'APP'
     if 'h5' in name: return 'H5'
@@ -667,39 +1275,38 @@ def get_file_label(filepath):
     return os.path.basename(filepath)
 
 def read_csv_file(filepath):
-    """读取CSV文件"""
+    """读取CSV文件（支持 .csv.gz / .csv.zst）"""
     rows = []
-    with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
-        reader = csv.DictReader(f)
+    with csv_dict_reader(filepath) as reader:
         fieldnames = reader.fieldnames
         for row in reader:
             row['__source_file__'] = filepath
             rows.append(row)
     return rows, fieldnames
 
-def run_scan(files, target_col, source_col, lang_key_col, terminology_file, output_dir):
-    """执行全量扫描"""
-    print(f"\n{'='*50}")
-    print(f"交易所语言QA引擎 - 全量扫描")
-    print(f"{'='*50}")
-    print(f"目标语言列: {target_col}")
-    print(f"源语言列: {source_col}")
-    print(f"术语表: {terminology_file}")
-    print(f"文件数: {len(files)}")
-    print(f"{'='*50}\n")
+SKILL_DIR = os.path.expanduser('~/.claude/skills/交易所语言QA')
+GLOSSARY_LANG_NAMES = {'越语': '越南语', '韩语': '韩语', '日语': '日语', '英语': '英语', '泰语': '泰语'}
 
-    # 加载术语
+
+def default_terminology_file(lang):
+    """按语言列名定位技能目录下的默认术语表（如 越语 → 术语表/越南语.md）"""
+    return os.path.join(SKILL_DIR, '术语表', f'{GLOSSARY_LANG_NAMES.get(lang, lang)}.md')
+
+def load_glossary(terminology_file, verbose=True):
+    """加载术语表全部内容，返回 (terms, overrides, forbidden, fragments)"""
     terms = load_terminology(terminology_file)
     overrides, forbidden = load_override_terms(terminology_file)
     fragments = load_fragment_map(terminology_file)
 
-    print(f"术语表加载完成: {len(terms)} 条术语, {len(overrides)} 条覆盖, {len(forbidden)} 条禁止, {len(fragments)} 条片段映射")
+    if verbose:
+        print(f"术语表加载完成: {len(terms)} 条术语, {len(overrides)} 条覆盖, {len(forbidden)} 条禁止, {len(fragments)} 条片段映射")
+    return terms, overrides, forbidden, fragments
 
-    # 读取所有文件
+def read_scan_files(files, target_col, source_col):
+    """读取并校验所有待扫描文件，行内标记 __pos__ = (文件序号, 行序号)"""
     all_rows = []
-    file_row_counts = {}
 
-    for filepath in files:
+    for file_idx, filepath in enumerate(files):
         rows, fieldnames = read_csv_file(filepath)
 
         # 验证列名
@@ -711,48 +1318,136 @@ def run_scan(files, target_col, source_col, lang_key_col, terminology_file, outp
             print(f"[ERROR] 文件 {filepath} 中未找到列 '{source_col}'")
             continue
 
-        file_row_counts[filepath] = len(rows)
+        for row_idx, row in enumerate(rows):
+            row['__pos__'] = (file_idx, row_idx)
         all_rows.extend(rows)
         print(f"  已读取: {filepath} ({len(rows)} 行)")
 
     print(f"\n总计: {len(all_rows)} 行\n")
+    return all_rows
+
+class QAEngine:
+    """可嵌入的QA引擎：术语表只解析一次，规则与匹配器（禁止术语正则、折叠表、宽度表）进程内共享。
+    命令行各子命令都是它的薄封装；流水线可持有一个热引擎反复调用，免去子进程与重复解析。
+
+    - check_row(row)                 单行检测，返回 [(priority, type, current, suggestion, detail)]
+    - scan_rows(rows)                生成器，逐条产出问题字典（不含跨行检测）
+    - scan_columns(sources, targets, keys)  按列批量检测
+    - scan(rows, sinks)              完整扫描（含跨行检测、排序），结果依次交给各 sink
+    """
+
+    def __init__(self, target_col, source_col='简体中文', lang_key_col='语言标识', terminology_file=None,
+                 glossary=None, fold_diacritics=False, verbose=True):
+        """glossary 为已加载的 (terms, overrides, forbidden, fragments)，给出时不再读取术语表文件；
+        两者都未给出时按 target_col 读取默认术语表（同命令行）
+        """
+        self.target_col = target_col
+        self.source_col = source_col
+        self.lang_key_col = lang_key_col
+        self.fold_diacritics = fold_diacritics
+        if glossary is None:
+            glossary = load_glossary(terminology_file or default_terminology_file(target_col), verbose)
+        self.terms, self.overrides, self.forbidden, self.fragments = glossary
+
+    def check_row(self, row, max_priority='P2'):
+        return scan_row(row, self.target_col, self.source_col, self.lang_key_col, self.terms, self.overrides,
+                        self.forbidden, self.fragments, row.get('__source_file__', ''), self.fold_diacritics,
+                        max_priority)
+
+    def scan_rows(self, rows, max_priority='P2'):
+        """逐行检测，按行顺序产出问题字典"""
+        lang_key_col = self.lang_key_col
+        for row in rows:
+            filepath = row.get('__source_file__', '')
+            row_issues = self.check_row(row, max_priority)
+            if not row_issues:
+                continue
 
-    # 逐行扫描
-    all_issues = []
-    issue_counter = Counter()
-    priority_counter = Counter()
-    file_counter = Counter()
-
-    for row in all_rows:
-        filepath = row['__source_file__']
-        file_label = get_file_label(filepath)
-        row_id = str(row.get('编号ID', '')).strip()
-        lang_key = str(row.get(lang_key_col, '')).strip() if lang_key_col and row.get(lang_key_col) else ''
-        source = str(row.get(source_col, '')).strip()
-
-        row_issues = scan_row(row, target_col, source_col, lang_key_col,
-                             terms, overrides, forbidden, fragments, filepath)
-
-        for priority, issue_type, current, suggestion, detail in row_issues:
-            all_issues.append({
-                'file': file_label,
-                'filepath': filepath,
-                'row_id': row_id,
-                'priority': priority,
-                'type': issue_type,
-                'lang_key': lang_key,
-                'current': current,
-                'suggestion': suggestion,
-                'detail': detail,
-            })
-            issue_counter[issue_type] += 1
-            priority_counter[priority] += 1
-            file_counter[file_label] += 1
-
-    # INCONSISTENCY检测
-    inconsistency_issues = check_inconsistency(all_rows, target_col, source_col, terms, overrides)
-    for issue in inconsistency_issues:
-        all_issues.append({
+            file_label = get_file_label(filepath)
+            row_id = str(row.get('编号ID', '')).strip()
+            lang_key = str(row.get(lang_key_col, '')).strip() if lang_key_col and row.get(lang_key_col) else ''
+            source = str(row.get(self.source_col, '')).strip()
+            for priority, issue_type, current, suggestion, detail in row_issues:
+                yield {
+                    'file': file_label,
+                    'filepath': filepath,
+                    'row_id': row_id,
+                    'priority': priority,
+                    'type': issue_type,
+                    'lang_key': lang_key,
+                    'current': current,
+                    'suggestion': suggestion,
+                    'detail': detail,
+                    'source': source,
+                    'pos': row.get('__pos__'),
+                }
+
+    def _column_rows(self, sources, targets, keys, filepath):
+        missing = object()
+        columns = (sources, targets) if keys is None else (sources, targets, keys)
+        for i, values in enumerate(zip_longest(*columns, fillvalue=missing)):
+            if any(value is missing for value in values):
+                raise ValueError(f'列长度不一致: 第 {i} 行起 sources/targets/keys 不等长')
+            source, target, key = values if keys is not None else (*values, '')
+            row = {self.source_col: source, self.target_col: target, '编号ID': str(i),
+                   '__source_file__': filepath, '__pos__': (0, i)}
+            if self.lang_key_col:
+                row[self.lang_key_col] = key
+            yield row
+
+    def scan_columns(self, sources, targets, keys=None, filepath='', cross_row=False):
+        """按列批量检测（等长可迭代对象，可为生成器），问题的 row_id 为序号（0起）；filepath 决定平台标签
+        cross_row=True 时附带 INCONSISTENCY / KEY_DIVERGENCE
+        """
+        rows = self._column_rows(sources, targets, keys, filepath)
+        if cross_row:
+            return self.scan(rows)
+        return list(self.scan_rows(rows))
+
+    def cross_row_issues(self, rows):
+        """跨行检测：INCONSISTENCY + KEY_DIVERGENCE"""
+        return cross_row_issues(collect_translations(rows, self.target_col, self.source_col),
+                                collect_key_index(rows, self.target_col, self.source_col, self.lang_key_col),
+                                self.terms, self.overrides)
+
+    def scan(self, rows, sinks=()):
+        """完整扫描：逐行 + 跨行检测 + 排序；sinks 为可调用对象，依次接收最终问题列表"""
+        rows = rows if isinstance(rows, list) else list(rows)
+        all_issues = list(self.scan_rows(rows))
+        all_issues.extend(self.cross_row_issues(rows))
+        sort_issues(all_issues)
+        for sink in sinks:
+            sink(all_issues)
+        return all_issues
+
+def csv_sink(output_file, decisions=None):
+    """QAEngine.scan 的 sink：输出问题清单CSV"""
+    return lambda all_issues: write_issue_csv(all_issues, output_file, decisions)
+
+def store_sink(path, lang):
+    """QAEngine.scan 的 sink：写入SQLite问题库"""
+    def sink(all_issues):
+        with open_issue_store(path) as conn:
+            store_upsert_issues(conn, lang, all_issues)
+    return sink
+
+def summary_sink(output_file=''):
+    """QAEngine.scan 的 sink：控制台摘要"""
+    return lambda all_issues: print_scan_summary(len(all_issues), count_issues(all_issues), output_file)
+
+ISSUE_CSV_HEADER = ['序号', '来源', '编号ID', '优先级', '问题类型', '语言标识', '当前翻译', '建议修正', '确认', '人工修正']
+SUMMARY_TYPES = ['EMPTY', 'UNTRANSLATED_COPY', 'CONTAINS_CHINESE', 'CHINESE_FRAGMENT',
+                 'MOJIBAKE', 'FULLWIDTH_PUNCTUATION', 'WRONG_TERM', 'TERMINOLOGY_MISMATCH',
+                 'INCONSISTENCY', 'KEY_DIVERGENCE', 'INCOMPLETE_TRANSLATION', 'PLACEHOLDER_MISMATCH', 'WHITESPACE',
+                 'CAPITALIZATION', 'TEXT_OVERFLOW', 'BROKEN_HTML']
+PRIORITY_ORDER = {'P0': 0, 'P1': 1, 'P2': 2}
+FILE_ORDER = {'APP': 0, 'H5': 1, 'Web': 2, '代理后台': 3}
+
+def cross_row_issues(source_translations, key_index, terms, overrides):
+    """跨行检测：INCONSISTENCY + KEY_DIVERGENCE"""
+    issues = []
+    for issue in inconsistency_from_translations(source_translations, terms, overrides):
+        issues.append({
             'file': get_file_label(issue['file']),
             'filepath': issue['file'],
             'row_id': issue['row_id'],
@@ -762,28 +1457,57 @@ def run_scan(files, target_col, source_col, lang_key_col, terminology_file, outp
             'current': issue['current'],
             'suggestion': issue['suggestion'],
             'detail': issue['detail'],
+            'source': issue['source'],
+            'pos': issue['pos'],
         })
-        issue_counter['INCONSISTENCY'] += 1
-        priority_counter['P1'] += 1
-        file_counter[get_file_label(issue['file'])] += 1
-
-    # 排序：P0 > P1 > P2，来源，编号ID降序
-    priority_order = {'P0': 0, 'P1': 1, 'P2': 2}
-    file_order = {'APP': 0, 'H5': 1, 'Web': 2, '代理后台': 3}
-
+    issues.extend(key_divergence_from_index(key_index or {}, terms, overrides))
+    return drop_covered_divergence(issues)
+
+def drop_covered_divergence(issues):
+    """同一行已报 INCONSISTENCY 时不再报 KEY_DIVERGENCE：同一处译文只提示一次，建议以 INCONSISTENCY 为准"""
+    flagged = {(issue['filepath'], issue['row_id']) for issue in issues if issue['type'] == 'INCONSISTENCY'}
+    if not flagged:
+        return issues
+    return [issue for issue in issues
+            if issue['type'] != 'KEY_DIVERGENCE' or (issue['filepath'], issue['row_id']) not in flagged]
+
+def sort_issues(all_issues):
+    """排序：P0 > P1 > P2，来源，编号ID降序"""
     all_issues.sort(key=lambda x: (
-        priority_order.get(x['priority'], 9),
-        file_order.get(x['file'], 9),
+        PRIORITY_ORDER.get(x['priority'], 9),
+        FILE_ORDER.get(x['file'], 9),
         -int(x['row_id']) if x['row_id'].isdigit() else 0
     ))
 
-    # 输出问题清单CSV
-    output_file = os.path.join(output_dir, f'{target_col}问题清单.csv')
-    with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+def count_issues(all_issues):
+    """返回 (issue_counter, priority_counter, file_counter)"""
+    issue_counter = Counter()
+    priority_counter = Counter()
+    file_counter = Counter()
+    for issue in all_issues:
+        issue_counter[issue['type']] += 1
+        priority_counter[issue['priority']] += 1
+        file_counter[issue['file']] += 1
+    return issue_counter, priority_counter, file_counter
+
+def _csv_quote(value):
+    return '"' + str(value).replace('"', '""') + '"'
+
+def write_issue_csv(all_issues, output_file, decisions=None, encoded=None):
+    """输出问题清单CSV；decisions 为 {content_hash: (确认, 人工修正)}
+    encoded 为流水线写出阶段预先编码的 {id(issue): 来源..建议修正 字段}，命中时直接拼接
+    output_file 以 .gz / .zst 结尾时压缩输出
+    """
+    with open_csv(output_file, 'w') as f:
         writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-        writer.writerow(['序号', '来源', '编号ID', '优先级', '问题类型', '语言标识', '当前翻译', '建议修正', '确认', '人工修正'])
+        writer.writerow(ISSUE_CSV_HEADER)
 
         for i, issue in enumerate(all_issues, 1):
+            confirm, manual_fix = decisions.get(issue_content_hash(issue), ('', '')) if decisions else ('', '')
+            body = encoded.get(id(issue)) if encoded else None
+            if body is not None:
+                f.write(f'"{i}",{body},{_csv_quote(confirm)},{_csv_quote(manual_fix)}\r\n')
+                continue
             writer.writerow([
                 i,
                 issue['file'],
@@ -793,22 +1517,21 @@ def run_scan(files, target_col, source_col, lang_key_col, terminology_file, outp
                 issue['lang_key'],
                 issue['current'],
                 issue['suggestion'],
-                '',
-                ''
+                confirm,
+                manual_fix
             ])
 
-    # 控制台摘要
+def print_scan_summary(total, counters, output_file):
+    issue_counter, priority_counter, file_counter = counters
     print(f"\n{'='*50}")
     print(f"扫描摘要")
     print(f"{'='*50}")
-    print(f"总问题数: {len(all_issues)}")
+    print(f"总问题数: {total}")
     print(f"\n按优先级:")
     for p in ['P0', 'P1', 'P2']:
         print(f"  {p}: {priority_counter[p]}")
     print(f"\n按问题类型:")
-    for t in ['EMPTY', 'UNTRANSLATED_COPY', 'CONTAINS_CHINESE', 'CHINESE_FRAGMENT',
-              'MOJIBAKE', 'FULLWIDTH_PUNCTUATION', 'WRONG_TERM', 'TERMINOLOGY_MISMATCH',
-              'INCONSISTENCY', 'INCOMPLETE_TRANSLATION', 'WHITESPACE', 'CAPITALIZATION', 'BROKEN_HTML']:
+    for t in SUMMARY_TYPES:
         if issue_counter[t] > 0:
             print(f"  {t}: {issue_counter[t]}")
     print(f"\n按来源:")
@@ -818,31 +1541,1478 @@ def run_scan(files, target_col, source_col, lang_key_col, terminology_file, outp
     for src in file_counter:
         if src not in ('APP', 'H5', 'Web', '代理后台'):
             print(f"  {src}: {file_counter[src]}")
-    print(f"\n问题清单已输出: {output_file}")
+    if output_file:
+        print(f"\n问题清单已输出: {output_file}")
     print(f"{'='*50}\n")
 
+def finalize_scan(all_issues, source_translations, terms, overrides, target_col, output_dir, store=None,
+                  tm_min_score=None, key_index=None, metrics=None, encoded=None, compress=None):
+    """INCONSISTENCY / KEY_DIVERGENCE + 排序 + 输出问题清单 + 控制台摘要
+    store 为 SQLite 问题库路径；tm_min_score 非空时启用翻译记忆建议
+    encoded 为流水线预编码的行内问题（TM 会改写建议修正，启用 TM 时不应传入）
+    compress 为 'gz' / 'zst' 时问题清单压缩输出
+    """
+    metrics = metrics or RunMetrics()
+    if tm_min_score is not None:
+        with metrics.stage('tm'):
+            tm_size, tm_suggested = apply_tm_suggestions(all_issues, source_translations, tm_min_score)
+        print(f"翻译记忆: {tm_size} 条干净译文, 为 {tm_suggested} 条问题给出建议 (相似度 ≥ {tm_min_score:.0%})")
+
+    with metrics.stage('cross_row'):
+        all_issues.extend(cross_row_issues(source_translations, key_index, terms, overrides))
+    counters = count_issues(all_issues)
+    with metrics.stage('sort'):
+        sort_issues(all_issues)
+
+    # 写入问题库，并取回历轮人工决定（按内容哈希沿用）
+    decisions = {}
+    if store:
+        with metrics.stage('store'), open_issue_store(store) as conn:
+            round_no = store_upsert_issues(conn, target_col, all_issues)
+            decisions = store_load_decisions(conn, target_col)
+        print(f"问题库已更新: {store} (第 {round_no} 轮, 沿用人工决定 {len(decisions)} 条)")
+
+    # 输出问题清单CSV（问题库模式下为导出视图）
+    output_file = os.path.join(output_dir, f'{target_col}问题清单.csv' + (f'.{compress}' if compress else ''))
+    with metrics.stage('write'):
+        write_issue_csv(all_issues, output_file, decisions, encoded)
+
+    # 控制台摘要
+    print_scan_summary(len(all_issues), counters, output_file)
+    metrics.record_issues(all_issues, counters)
+    metrics.record_translations(source_translations)
+
     return all_issues, output_file
 
+def parse_shard(spec):
+    """解析 --shard i/N（i 从1开始），返回 (i, N)"""
+    try:
+        i, n = (int(x) for x in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'分片格式应为 i/N: {spec}')
+    if n < 1 or not 1 <= i <= n:
+        raise argparse.ArgumentTypeError(f'分片序号越界: {spec}')
+    return i, n
+
+def run_scan(files, target_col, source_col, lang_key_col, terminology_file, output_dir, shard=None, store=None,
+             tm_min_score=None, fold_diacritics=False, metrics_file=None, metrics=None, batch_size=None,
+             compress=None):
+    """执行全量扫描；指定 shard=(i, N) 时只扫描第i片并输出分片结果
+    metrics_file 非空时输出运行指标（Prometheus 文本 + JSON）；metrics 为调用方已有的 RunMetrics
+    读取、逐行检测、问题编码三个阶段以 batch_size 行为一批流水线并行
+    """
+    metrics = metrics or RunMetrics('scan', target_col)
+    print(f"\n{'='*50}")
+    print(f"交易所语言QA引擎 - 全量扫描")
+    print(f"{'='*50}")
+    print(f"目标语言列: {target_col}")
+    print(f"源语言列: {source_col}")
+    print(f"术语表: {terminology_file}")
+    print(f"文件数: {len(files)}")
+    if shard:
+        print(f"分片: {shard[0]}/{shard[1]}")
+    print(f"{'='*50}\n")
+
+    # 加载术语
+    with metrics.stage('glossary'):
+        engine = QAEngine(target_col, source_col, lang_key_col, terminology_file, fold_diacritics=fold_diacritics)
+    metrics.record_glossary(engine)
+
+    # 读取 → 逐行检测 + 跨行聚合 → 问题编码（分片/TM 模式不预编码）
+    with metrics.stage('pipeline'):
+        row_count, all_issues, source_translations, key_index, encoded = scan_pipeline(
+            engine, files, batch_size or PIPELINE_BATCH_SIZE, shard,
+            encode=not shard and tm_min_score is None, metrics=metrics)
+    if shard:
+        print(f"本分片: {row_count} 行\n")
+    metrics.rows = row_count
+
+    if shard:
+        part_file = write_partial(all_issues, source_translations, files, target_col, source_col,
+                                  shard, row_count, output_dir, key_index)
+        print(f"分片结果已输出: {part_file} ({len(all_issues)} 条行内问题)")
+        print(f"{'='*50}\n")
+        metrics.record_issues(all_issues)
+        metrics.record_translations(source_translations)
+        result = all_issues, part_file
+    else:
+        result = finalize_scan(all_issues, source_translations, engine.terms, engine.overrides, target_col,
+                               output_dir, store, tm_min_score, key_index, metrics, encoded, compress)
+
+    if metrics_file:
+        print(f"运行指标已输出: {', '.join(metrics.write(metrics_file))}\n")
+    return result
+
 # ============================================================
-# 12. 批量修正
+# 11.1 分片结果输出与合并
 # ============================================================
-def run_fix(files, target_col, issues_file):
-    """根据问题清单批量修正CSV"""
+PARTIAL_FORMAT = 'qa-scan-partial/1'
+
+def write_partial(all_issues, source_translations, files, target_col, source_col, shard, row_count, output_dir,
+                  key_index=None):
+    """输出分片结果：行内问题 + 可合并的 source→target 聚合与语言标识索引（含位置）"""
+    i, n = shard
+    translations = {
+        source: {
+            target: [[pos[0], pos[1], row_id] for row_id, file_name, pos in locations]
+            for target, locations in targets.items()
+        }
+        for source, targets in source_translations.items()
+    }
+    payload = {
+        'format': PARTIAL_FORMAT,
+        'shard': [i, n],
+        'target_col': target_col,
+        'source_col': source_col,
+        'files': list(files),
+        'rows': row_count,
+        'issues': [{k: (list(v) if k == 'pos' else v) for k, v in issue.items()} for issue in all_issues],
+        'translations': translations,
+        'key_index': {
+            lang_key: [[platform, source, target, pos[0], pos[1], row_id]
+                       for platform, (source, target, row_id, filepath, pos) in platforms.items()]
+            for lang_key, platforms in (key_index or {}).items()
+        },
+    }
+    part_file = os.path.join(output_dir, f'{target_col}问题清单.part{i}of{n}.json')
+    with open(part_file, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+    return part_file
+
+def merge_partials(part_files):
+    """合并N个分片，按全局行位置还原单机扫描的问题顺序与聚合顺序"""
+    parts = []
+    for path in part_files:
+        with open(path, 'r', encoding='utf-8') as f:
+            parts.append(json.load(f))
+
+    if not parts:
+        raise ValueError('没有分片文件')
+    head = parts[0]
+    for part in parts:
+        if part.get('format') != PARTIAL_FORMAT:
+            raise ValueError(f"不是分片结果文件: {part.get('format')}")
+        for key in ('target_col', 'source_col', 'files'):
+            if part[key] != head[key]:
+                raise ValueError(f'分片参数不一致: {key}')
+    n = head['shard'][1]
+    got = sorted(part['shard'][0] for part in parts)
+    if any(part['shard'][1] != n for part in parts) or got != list(range(1, n + 1)):
+        raise ValueError(f'分片不完整: 需要 1..{n}，实际 {got}')
+
+    files = head['files']
+
+    # 行内问题：按 (文件序号, 行序号) 稳定排序，同一行内保持原检测顺序
+    all_issues = []
+    for part in parts:
+        for issue in part['issues']:
+            issue['pos'] = tuple(issue['pos'])
+            all_issues.append(issue)
+    all_issues.sort(key=lambda x: x['pos'])
+
+    # 聚合：位置合并后按首次出现位置恢复插入顺序
+    merged = defaultdict(lambda: defaultdict(list))
+    for part in parts:
+        for source, targets in part['translations'].items():
+            for target, locations in targets.items():
+                for file_idx, row_idx, row_id in locations:
+                    merged[source][target].append((row_id, files[file_idx], (file_idx, row_idx)))
+
+    source_translations = {}
+    for source in sorted(merged, key=lambda s: min(loc[2] for locs in merged[s].values() for loc in locs)):
+        targets = merged[source]
+        source_translations[source] = {
+            target: sorted(targets[target], key=lambda loc: loc[2])
+            for target in sorted(targets, key=lambda t: min(loc[2] for loc in targets[t]))
+        }
+
+    # 语言标识索引：每个平台保留全局最先出现的一行，key 按首次出现位置排序
+    merged_keys = defaultdict(dict)
+    for part in parts:
+        for lang_key, entries in part.get('key_index', {}).items():
+            platforms = merged_keys[lang_key]
+            for platform, source, target, file_idx, row_idx, row_id in entries:
+                pos = (file_idx, row_idx)
+                if platform not in platforms or pos < platforms[platform][4]:
+                    platforms[platform] = (source, target, row_id, files[file_idx], pos)
+    key_index = {}
+    for lang_key in sorted(merged_keys, key=lambda k: min(e[4] for e in merged_keys[k].values())):
+        platforms = merged_keys[lang_key]
+        key_index[lang_key] = dict(sorted(platforms.items(), key=lambda kv: kv[1][4]))
+
+    row_count = sum(part['rows'] for part in parts)
+    return all_issues, source_translations, key_index, head['target_col'], row_count
+
+def run_merge(part_files, terminology_file, output_dir, store=None, tm_min_score=None, compress=None):
+    """合并分片结果，输出与单机扫描一致的问题清单与摘要"""
     print(f"\n{'='*50}")
-    print(f"批量修正")
+    print(f"交易所语言QA引擎 - 合并分片")
+    print(f"{'='*50}")
+    print(f"分片文件数: {len(part_files)}")
+    print(f"术语表: {terminology_file}")
     print(f"{'='*50}\n")
 
-    # 读取问题清单
+    terms, overrides, forbidden, fragments = load_glossary(terminology_file)
+    all_issues, source_translations, key_index, target_col, row_count = merge_partials(part_files)
+    print(f"\n总计: {row_count} 行\n")
+
+    return finalize_scan(all_issues, source_translations, terms, overrides, target_col, output_dir, store,
+                         tm_min_score, key_index, compress=compress)
+
+# ============================================================
+# 11.2 SQLite问题库
+# ============================================================
+# 问题清单CSV只是导出视图；问题库保存每轮扫描结果与人工决定。
+# 人工决定按 (源文本, 当前翻译) 内容哈希保存，重新扫描后内容未变的行自动沿用。
+# 问题主键含源文件路径（绝对路径）与文件内行序号：多个文件同属一个平台标签、同一文件重复编号ID时各自保留；
+# fix --db 按 (源文件路径, 行序号) 回写。seq 为本轮问题清单CSV中的序号，导入人工决定时据此定位问题。
+ISSUE_STORE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS issues (
+    lang TEXT NOT NULL,
+    file TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    row_pos INTEGER NOT NULL,
+    row_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    lang_key TEXT,
+    current TEXT,
+    suggestion TEXT,
+    detail TEXT,
+    content_hash TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    seq INTEGER NOT NULL DEFAULT -1,
+    PRIMARY KEY (lang, filepath, row_pos, row_id, type)
+);
+CREATE INDEX IF NOT EXISTS idx_issues_file_row ON issues (file, row_id);
+CREATE INDEX IF NOT EXISTS idx_issues_type ON issues (type);
+CREATE INDEX IF NOT EXISTS idx_issues_priority ON issues (priority);
+CREATE INDEX IF NOT EXISTS idx_issues_hash ON issues (content_hash);
+CREATE TABLE IF NOT EXISTS decisions (
+    content_hash TEXT PRIMARY KEY,
+    confirm TEXT NOT NULL DEFAULT '',
+    manual_fix TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    round INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    scanned_at TEXT NOT NULL,
+    issue_count INTEGER NOT NULL,
+    PRIMARY KEY (lang, round)
+);
+'''
+
+# 旧版问题库（主键为 lang, file, row_id, type）迁移：原有问题沿用平台标签作路径、行序号记 -1
+ISSUE_STORE_MIGRATION = '''
+BEGIN;
+ALTER TABLE issues RENAME TO issues_v1;
+DROP INDEX IF EXISTS idx_issues_file_row;
+DROP INDEX IF EXISTS idx_issues_type;
+DROP INDEX IF EXISTS idx_issues_priority;
+DROP INDEX IF EXISTS idx_issues_hash;
+''' + ISSUE_STORE_SCHEMA + '''
+INSERT INTO issues (lang, file, filepath, row_pos, row_id, type, priority, lang_key, current, suggestion, detail,
+                    content_hash, round)
+SELECT lang, file, file, -1, row_id, type, priority, lang_key, current, suggestion, detail, content_hash, round
+FROM issues_v1;
+DROP TABLE issues_v1;
+COMMIT;
+'''
+
+class _IssueStore:
+    """sqlite3 连接的上下文管理：正常退出提交，异常回滚，总是关闭"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(ISSUE_STORE_SCHEMA)
+        columns = {column[1] for column in self.conn.execute('PRAGMA table_info(issues)')}
+        if 'filepath' not in columns:
+            self.conn.executescript(ISSUE_STORE_MIGRATION)
+        elif 'seq' not in columns:
+            self.conn.execute('ALTER TABLE issues ADD COLUMN seq INTEGER NOT NULL DEFAULT -1')
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+def open_issue_store(path):
+    return _IssueStore(path)
+
+def content_hash(source, target):
+    return hashlib.sha1(f'{source}\x1f{target}'.encode('utf-8')).hexdigest()
+
+def issue_content_hash(issue):
+    return content_hash(issue.get('source', ''), issue['current'])
+
+def _issue_store_key(issue):
+    """问题库主键（不含 lang）：(源文件绝对路径, 文件内行序号, 编号ID, 类型)；无行位置时行序号记 -1"""
+    pos = issue.get('pos')
+    filepath = os.path.abspath(issue['filepath']) if issue.get('filepath') else issue['file']
+    return filepath, pos[1] if pos is not None else -1, issue['row_id'], issue['type']
+
+def store_upsert_issues(conn, lang, all_issues):
+    """写入本轮问题（upsert），删除本语言上一轮残留（已修复）的问题，返回轮次
+    all_issues 须为问题清单的输出顺序（序号 = 下标 + 1）
+    主键重复（无行位置且同一文件编号ID重复）时拒绝写入，不静默覆盖
+    """
+    keys = [_issue_store_key(i) for i in all_issues]
+    duplicates = [key for key, n in Counter(keys).items() if n > 1]
+    if duplicates:
+        filepath, _, row_id, issue_type = duplicates[0]
+        raise ValueError(f'问题库主键重复 {len(duplicates)} 处（如 {filepath} #{row_id} {issue_type}），'
+                         f'问题需带行位置（__pos__）才能区分重复编号ID')
+    round_no = conn.execute('SELECT COALESCE(MAX(round), 0) + 1 FROM rounds WHERE lang = ?', (lang,)).fetchone()[0]
+    conn.executemany('''
+        INSERT INTO issues (lang, file, filepath, row_pos, row_id, type, priority, lang_key, current, suggestion,
+                            detail, content_hash, round, seq)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (lang, filepath, row_pos, row_id, type) DO UPDATE SET
+            file = excluded.file, priority = excluded.priority, lang_key = excluded.lang_key,
+            current = excluded.current, suggestion = excluded.suggestion, detail = excluded.detail,
+            content_hash = excluded.content_hash, round = excluded.round, seq = excluded.seq
+    ''', [(lang, i['file'], filepath, row_pos, row_id, issue_type, i['priority'], i['lang_key'], i['current'],
+           i['suggestion'], i['detail'], issue_content_hash(i), round_no, seq)
+          for seq, (i, (filepath, row_pos, row_id, issue_type)) in enumerate(zip(all_issues, keys), 1)])
+    conn.execute('DELETE FROM issues WHERE lang = ? AND round < ?', (lang, round_no))
+    conn.execute('INSERT INTO rounds (round, lang, scanned_at, issue_count) VALUES (?, ?, ?, ?)',
+                 (round_no, lang, datetime.now().isoformat(timespec='seconds'), len(all_issues)))
+    return round_no
+
+def store_load_decisions(conn, lang):
+    """本语言当前问题涉及的人工决定 {content_hash: (确认, 人工修正)}"""
+    cur = conn.execute('''
+        SELECT DISTINCT d.content_hash, d.confirm, d.manual_fix
+        FROM decisions d JOIN issues i ON i.content_hash = d.content_hash
+        WHERE i.lang = ?
+    ''', (lang,))
+    return {h: (confirm, manual_fix) for h, confirm, manual_fix in cur}
+
+def store_import_decisions(conn, lang, issues_file):
+    """从人工审核后的问题清单CSV导入 确认/人工修正，返回 (导入条数, 未匹配条数)
+    按序号定位本轮问题（即其源文件路径与行序号），并核对来源/编号ID/类型/当前翻译；
+    不是本轮导出的清单（已重新扫描）时对不上的行不导入
+    """
+    imported = unmatched = 0
+    now = datetime.now().isoformat(timespec='seconds')
+    with open_csv(issues_file) as f:
+        for row in csv.DictReader(f):
+            confirm = (row.get('确认') or '').strip()
+            manual_fix = (row.get('人工修正') or '').strip()
+            if not confirm and not manual_fix:
+                continue
+            seq = (row.get('序号') or '').strip()
+            found = conn.execute(
+                'SELECT content_hash FROM issues WHERE lang = ? AND seq = ? AND file = ? AND row_id = ? AND type = ? '
+                'AND current = ?',
+                (lang, int(seq) if seq.isdigit() else -1, row.get('来源', ''), row.get('编号ID', ''),
+                 row.get('问题类型', ''), row.get('当前翻译', ''))).fetchone()
+            if not found:
+                unmatched += 1
+                continue
+            conn.execute('''
+                INSERT INTO decisions (content_hash, confirm, manual_fix, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    confirm = CASE WHEN excluded.confirm != '' THEN excluded.confirm ELSE confirm END,
+                    manual_fix = CASE WHEN excluded.manual_fix != '' THEN excluded.manual_fix ELSE manual_fix END,
+                    updated_at = excluded.updated_at
+            ''', (found[0], confirm, manual_fix, now))
+            imported += 1
+    return imported, unmatched
+
+def store_fix_map(conn, lang):
+    """直接从问题库构建修正映射 {(源文件绝对路径, 行序号, 编号ID): suggestion}，人工修正优先
+    编号ID 一并作键，文件在扫描后被改动（行错位）时不会写到别的行
+    """
+    fix_map = {}
+    cur = conn.execute('''
+        SELECT i.filepath, i.row_pos, i.row_id, i.suggestion, COALESCE(d.manual_fix, '')
+        FROM issues i LEFT JOIN decisions d ON d.content_hash = i.content_hash
+        WHERE i.lang = ? AND i.row_pos >= 0
+    ''', (lang,))
+    for filepath, row_pos, row_id, suggestion, manual_fix in cur:
+        _add_fix(fix_map, (filepath, row_pos, row_id), manual_fix.strip() or (suggestion or '').strip())
+    legacy = conn.execute('SELECT COUNT(*) FROM issues WHERE lang = ? AND row_pos < 0', (lang,)).fetchone()[0]
+    if legacy:
+        print(f"[WARN] 问题库中 {legacy} 条问题没有行位置（旧版问题库），请先重新扫描再修正")
+    return fix_map
+
+# ============================================================
+# 11.3 版本增量扫描（--baseline）
+# ============================================================
+# 新旧两版导出按 (来源, 编号ID) 排序后归并连接，只扫描新增/修改行；
+# 跨行检测在两版聚合上各算一次（不跑逐行规则）。问题按 (来源, 编号ID, 类型) 分为 新增/已修复/持续；
+# 新版已不存在的行上的旧问题单列为"已删除"，不算作已修复。
+DELTA_CSV_HEADER = ['序号', '状态', '变更', '来源', '编号ID', '优先级', '问题类型', '语言标识', '当前翻译', '建议修正']
+DELTA_STATUS_ORDER = {'新增': 0, '持续': 1, '已修复': 2, '已删除': 3}
+
+def _snapshot_sorted(rows):
+    """按 (来源, 编号ID, 同ID出现序号) 排序，重复ID按出现顺序一一配对"""
+    seen = Counter()
+    keyed = []
+    for row in rows:
+        key = (get_file_label(row['__source_file__']), str(row.get('编号ID', '')).strip())
+        keyed.append(((key[0], key[1], seen[key]), row))
+        seen[key] += 1
+    keyed.sort(key=lambda kr: kr[0])
+    return keyed
+
+def diff_snapshots(old_rows, new_rows, compare_cols):
+    """归并连接两版导出，返回 (added, modified[(old, new)], removed, unchanged_count)"""
+    old = _snapshot_sorted(old_rows)
+    new = _snapshot_sorted(new_rows)
+    added, modified, removed = [], [], []
+    unchanged = 0
+    i = j = 0
+
+    while i < len(old) or j < len(new):
+        if j >= len(new) or (i < len(old) and old[i][0] < new[j][0]):
+            removed.append(old[i][1])
+            i += 1
+        elif i >= len(old) or new[j][0] < old[i][0]:
+            added.append(new[j][1])
+            j += 1
+        else:
+            o, n = old[i][1], new[j][1]
+            if any(str(o.get(c) or '').strip() != str(n.get(c) or '').strip() for c in compare_cols):
+                modified.append((o, n))
+            else:
+                unchanged += 1
+            i += 1
+            j += 1
+
+    return added, modified, removed, unchanged
+
+def classify_delta(old_issues, new_issues, deleted_rows=frozenset()):
+    """返回 (新增, 已修复, 持续, 已删除)，以 (来源, 编号ID, 问题类型) 为问题标识
+    deleted_rows 为新版已不存在的 {(来源, 编号ID)}：其上的旧问题归为已删除
+    """
+    def key(issue):
+        return issue['file'], issue['row_id'], issue['type']
+    old_keys = {key(i) for i in old_issues}
+    new_keys = {key(i) for i in new_issues}
+    added = [i for i in new_issues if key(i) not in old_keys]
+    gone = [i for i in old_issues if key(i) not in new_keys]
+    fixed = [i for i in gone if (i['file'], i['row_id']) not in deleted_rows]
+    deleted = [i for i in gone if (i['file'], i['row_id']) in deleted_rows]
+    persisting = [i for i in new_issues if key(i) in old_keys]
+    return added, fixed, persisting, deleted
+
+def run_delta_scan(files, baseline_files, target_col, source_col, lang_key_col, terminology_file, output_dir,
+                   fold_diacritics=False):
+    """版本增量扫描：只扫描相对基线新增/修改的行，输出新增问题清单 + 增量报告"""
+    print(f"\n{'='*50}")
+    print(f"交易所语言QA引擎 - 版本增量扫描")
+    print(f"{'='*50}")
+    print(f"目标语言列: {target_col}")
+    print(f"源语言列: {source_col}")
+    print(f"术语表: {terminology_file}")
+    print(f"文件数: {len(files)} (基线 {len(baseline_files)})")
+    print(f"{'='*50}\n")
+
+    engine = QAEngine(target_col, source_col, lang_key_col, terminology_file, fold_diacritics=fold_diacritics)
+
+    print("新版本:")
+    new_rows = read_scan_files(files, target_col, source_col)
+    print("基线版本:")
+    old_rows = read_scan_files(baseline_files, target_col, source_col)
+
+    compare_cols = [c for c in (source_col, target_col, lang_key_col) if c]
+    added, modified, removed, unchanged = diff_snapshots(old_rows, new_rows, compare_cols)
+    print(f"变更: 新增 {len(added)} 行, 修改 {len(modified)} 行, 删除 {len(removed)} 行, 未变 {unchanged} 行\n")
+
+    change_of = {}
+    for row in added:
+        change_of[id(row)] = '新增行'
+    for o, n in modified:
+        change_of[id(o)] = change_of[id(n)] = '修改行'
+    for row in removed:
+        change_of[id(row)] = '删除行'
+
+    # 逐行规则只跑变更行（新版的新增/修改行 + 旧版的修改/删除行）
+    changed_new = added + [n for o, n in modified]
+    changed_old = [o for o, n in modified] + removed
+    new_issues = list(engine.scan_rows(changed_new))
+    old_issues = list(engine.scan_rows(changed_old))
+    row_change = {}
+    for rows in (changed_new, changed_old):
+        for row in rows:
+            row_change[(get_file_label(row['__source_file__']), str(row.get('编号ID', '')).strip())] = change_of[id(row)]
+
+    # 跨行检测需要全局状态：两版各做一次聚合
+    new_issues.extend(engine.cross_row_issues(new_rows))
+    old_issues.extend(engine.cross_row_issues(old_rows))
+
+    def row_key(row):
+        return get_file_label(row['__source_file__']), str(row.get('编号ID', '')).strip()
+    deleted_rows = {row_key(row) for row in removed} - {row_key(row) for row in new_rows}
+    fresh, fixed, persisting, deleted = classify_delta(old_issues, new_issues, deleted_rows)
+
+    # 问题清单只含新增问题（已接受的旧问题不再重复出现）
+    counters = count_issues(fresh)
+    sort_issues(fresh)
+    output_file = os.path.join(output_dir, f'{target_col}问题清单.csv')
+    write_issue_csv(fresh, output_file)
+
+    # 增量报告：全部分类问题
+    report = [('新增', i) for i in fresh] + [('持续', i) for i in persisting] + [('已修复', i) for i in fixed] + \
+             [('已删除', i) for i in deleted]
+    report.sort(key=lambda si: (
+        DELTA_STATUS_ORDER[si[0]],
+        PRIORITY_ORDER.get(si[1]['priority'], 9),
+        FILE_ORDER.get(si[1]['file'], 9),
+        -int(si[1]['row_id']) if si[1]['row_id'].isdigit() else 0
+    ))
+    report_file = os.path.join(output_dir, f'{target_col}增量报告.csv')
+    with open(report_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(DELTA_CSV_HEADER)
+        for n, (status, issue) in enumerate(report, 1):
+            writer.writerow([
+                n,
+                status,
+                row_change.get((issue['file'], issue['row_id']), '未变行'),
+                issue['file'],
+                issue['row_id'],
+                issue['priority'],
+                issue['type'],
+                issue['lang_key'],
+                issue['current'],
+                issue['suggestion'],
+            ])
+
+    print(f"\n{'='*50}")
+    print(f"增量摘要")
+    print(f"{'='*50}")
+    print(f"新增问题: {len(fresh)}")
+    print(f"已修复问题: {len(fixed)}")
+    if deleted:
+        print(f"已删除行上的问题: {len(deleted)}（不计入已修复）")
+    print(f"持续问题: {len(persisting)}（仅统计变更行与跨行检测）")
+    print(f"增量报告已输出: {report_file}")
+    print_scan_summary(len(fresh), counters, output_file)
+
+    return fresh, output_file
+
+# ============================================================
+# 11.4 抽样快速扫描（--sample / --sample-rate）
+# ============================================================
+# 按 来源 × 源文本长度段 × 语言标识前缀 分层，按比例分配样本，层内简单随机抽样；
+# 只跑逐行检测（scan_row），估计"含某类问题的行"占比。
+# 区间：分层方差 → Kish 有效样本量 → Wilson 区间（零命中时仍给出上界）。
+# INCONSISTENCY / KEY_DIVERGENCE 依赖全量聚合，不在估计范围内。
+SAMPLE_LENGTH_BANDS = [(10, '≤10字'), (40, '11-40字'), (None, '>40字')]
+SAMPLE_MIN_PREFIX_ROWS = 2  # 前缀层期望样本数低于此值时并入同来源同长度段的"其他"层
+SAMPLE_Z = 1.96  # 95% 置信
+SAMPLE_CSV_HEADER = ['维度', '项目', '样本命中行', '估计占比', '置信下限', '置信上限', '预计全量行数']
+RE_KEY_PREFIX = re.compile(r'[._\-:/]')
+
+def length_band(text):
+    n = len(text)
+    for limit, label in SAMPLE_LENGTH_BANDS:
+        if limit is None or n <= limit:
+            return label
+
+def key_prefix(lang_key):
+    return RE_KEY_PREFIX.split(lang_key, 1)[0] if lang_key else ''
+
+def build_strata(all_rows, source_col, lang_key_col, sample_size):
+    """返回 {(来源, 长度段, 前缀): [row, ...]}，样本量撑不起的小前缀并入「其他」层"""
+    strata = defaultdict(list)
+    for row in all_rows:
+        source = str(row.get(source_col) or '').strip()
+        lang_key = str(row.get(lang_key_col) or '').strip() if lang_key_col else ''
+        strata[(get_file_label(row['__source_file__']), length_band(source), key_prefix(lang_key))].append(row)
+
+    min_rows = SAMPLE_MIN_PREFIX_ROWS * len(all_rows) / max(sample_size, 1)
+    merged = defaultdict(list)
+    for (label, band, prefix), rows in strata.items():
+        merged[(label, band, prefix if len(rows) >= min_rows else '*其他')].extend(rows)
+    return merged
+
+def allocate_sample(strata, sample_size):
+    """按层大小比例分配样本量（最大余数法），返回 {层: n_h}"""
+    total = sum(len(rows) for rows in strata.values())
+    sample_size = min(sample_size, total)
+    quotas = {h: sample_size * len(rows) / total for h, rows in strata.items()}
+    alloc = {h: int(q) for h, q in quotas.items()}
+    rest = sample_size - sum(alloc.values())
+    for h in sorted(quotas, key=lambda h: alloc[h] - quotas[h])[:rest]:
+        alloc[h] += 1
+    return alloc
+
+def wilson_interval(p, n, z=SAMPLE_Z):
+    """比例 p、（有效）样本量 n 的 Wilson 区间"""
+    if n <= 0:
+        return 0.0, 1.0
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+def stratified_estimate(strata_hits, strata_sizes, sample_sizes):
+    """分层比例估计：strata_hits/sample_sizes/strata_sizes 均为 {层: 数}，返回 (p, 下限, 上限)"""
+    total = sum(strata_sizes[h] for h in sample_sizes if sample_sizes[h])
+    p = var = 0.0
+    for h, n_h in sample_sizes.items():
+        if not n_h:
+            continue
+        w = strata_sizes[h] / total
+        p_h = strata_hits.get(h, 0) / n_h
+        p += w * p_h
+        if n_h > 1:
+            fpc = 1 - n_h / strata_sizes[h]
+            var += w * w * fpc * p_h * (1 - p_h) / (n_h - 1)
+    n = sum(sample_sizes.values())
+    n_eff = p * (1 - p) / var if var > 0 else n
+    low, high = wilson_interval(p, n_eff)
+    return p, low, high
+
+def run_sample_scan(files, target_col, source_col, lang_key_col, terminology_file, output_dir,
+                    sample_size=None, sample_rate=None, seed=None, fold_diacritics=False):
+    """抽样快速扫描：分层抽样跑逐行检测，输出各问题类型/优先级的行占比估计与置信区间"""
+    print(f"\n{'='*50}")
+    print(f"交易所语言QA引擎 - 抽样快速扫描")
+    print(f"{'='*50}")
+    print(f"目标语言列: {target_col}")
+    print(f"源语言列: {source_col}")
+    print(f"术语表: {terminology_file}")
+    print(f"文件数: {len(files)}")
+    print(f"{'='*50}\n")
+
+    engine = QAEngine(target_col, source_col, lang_key_col, terminology_file, fold_diacritics=fold_diacritics)
+    all_rows = read_scan_files(files, target_col, source_col)
+    if not all_rows:
+        print("无可扫描的行")
+        return {}, None
+    if sample_size is None:
+        sample_size = max(1, round(len(all_rows) * sample_rate))
+
+    rng = random.Random(seed)
+    strata = build_strata(all_rows, source_col, lang_key_col, sample_size)
+    alloc = allocate_sample(strata, sample_size)
+    sample = {h: rng.sample(rows, alloc[h]) for h, rows in strata.items()}
+    sample_sizes = {h: len(rows) for h, rows in sample.items()}
+    strata_sizes = {h: len(rows) for h, rows in strata.items()}
+    n = sum(sample_sizes.values())
+    print(f"分层: {len(strata)} 层 (来源 × 长度段 × 语言标识前缀), 样本: {n} 行 ({n / len(all_rows):.2%})\n")
+
+    # 每个维度按"该行是否命中"计数：{(维度, 项目): {层: 命中行数}}
+    hits = defaultdict(Counter)
+    for h, rows in sample.items():
+        for row in rows:
+            row_issues = engine.check_row(row)
+            marks = {('类型', issue_type) for _, issue_type, _, _, _ in row_issues}
+            marks |= {('优先级', priority) for priority, _, _, _, _ in row_issues}
+            if row_issues:
+                marks.add(('合计', '任一问题'))
+            for mark in marks:
+                hits[mark][h] += 1
+
+    type_order = {t: i for i, t in enumerate(SUMMARY_TYPES)}
+    dims = [('合计', '任一问题')] + [('优先级', p) for p in PRIORITY_ORDER]
+    dims += sorted((m for m in hits if m[0] == '类型'), key=lambda m: type_order.get(m[1], len(type_order)))
+
+    estimates = {}
+    for dim in dims:
+        estimates[dim] = stratified_estimate(hits[dim], strata_sizes, sample_sizes)
+
+    output_file = os.path.join(output_dir, f'{target_col}抽样估计.csv')
+    with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(SAMPLE_CSV_HEADER)
+        for (dim, item), (p, low, high) in estimates.items():
+            writer.writerow([dim, item, sum(hits[(dim, item)].values()), f'{p:.4%}', f'{low:.4%}', f'{high:.4%}',
+                             round(p * len(all_rows))])
+
+    print(f"\n{'='*50}")
+    print(f"抽样估计（{SAMPLE_Z} σ ≈ 95% 置信，按行占比）")
+    print(f"{'='*50}")
+    print(f"全量: {len(all_rows)} 行, 样本: {n} 行")
+    last_dim = None
+    for (dim, item), (p, low, high) in estimates.items():
+        if dim != last_dim:
+            print(f"\n按{dim}:" if dim != '合计' else '')
+            last_dim = dim
+        print(f"  {item:<24} {p:>8.2%}  [{low:.2%}, {high:.2%}]  预计 {round(p * len(all_rows))} 行"
+              f" ({round(low * len(all_rows))}-{round(high * len(all_rows))})")
+    print(f"\n注: INCONSISTENCY / KEY_DIVERGENCE 为跨行检测，需全量扫描")
+    print(f"抽样估计已输出: {output_file}")
+    print(f"{'='*50}\n")
+
+    return estimates, output_file
+
+# ============================================================
+# 11.5 运行指标（--metrics）
+# ============================================================
+# 定时任务用：输出 Prometheus/OpenMetrics 文本（node-exporter textfile collector 可直接采集）
+# 与同名 .json 摘要。两个文件都先写临时文件再 os.replace，采集端不会读到半个文件。
+METRICS_PREFIX = 'qa'
+
+def metrics_json_path(path):
+    """--metrics 文件对应的 .json 摘要路径；path 本身是 .json 时两者会互相覆盖，直接拒绝"""
+    root, ext = os.path.splitext(path)
+    if ext.lower() == '.json':
+        raise ValueError(f'--metrics 应为 Prometheus 文本文件（如 qa_越语.prom），不能是 .json: {path}')
+    return root + '.json'
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # Linux 单位为 KB
+
+def write_atomic(path, text):
+    """同目录临时文件 + os.replace 原子替换"""
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def _metric_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}'
+
+class RunMetrics:
+    """一次运行的指标：分阶段耗时、行数、术语表规模、去重/缓存命中率、问题数（类型 × 优先级 × 平台）"""
+
+    def __init__(self, command='scan', target_col=''):
+        self.command = command
+        self.target_col = target_col
+        self.started = time.time()
+        self.stages = {}
+        self.rows = 0
+        self.glossary = {}
+        self.issue_matrix = Counter()
+        self.counters = (Counter(), Counter(), Counter())
+        self.translation_rows = 0
+        self.translation_pairs = 0
+        self.gates = {}
+        self.cache_start = Counter(CACHE_STATS)  # CACHE_STATS 为进程级累计，按本次运行的增量计算命中率
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record_glossary(self, engine):
+        self.glossary = {'terms': len(engine.terms), 'overrides': len(engine.overrides),
+                         'forbidden': len(engine.forbidden), 'fragments': len(engine.fragments)}
+
+    def record_issues(self, all_issues, counters=None):
+        self.counters = counters or count_issues(all_issues)
+        self.issue_matrix = Counter((i['type'], i['priority'], i['file']) for i in all_issues)
+
+    def record_translations(self, source_translations):
+        """source→target 聚合：相同 (源, 译) 的行只算一对，用于去重率"""
+        self.translation_pairs = sum(len(targets) for targets in source_translations.values())
+        self.translation_rows = sum(len(locs) for targets in source_translations.values()
+                                    for locs in targets.values())
+
+    def summary(self):
+        issue_counter, priority_counter, file_counter = self.counters
+        row_scan = self.stages.get('row_scan', 0.0)
+        cache_stats = CACHE_STATS - self.cache_start
+        lookups = cache_stats['standard_lookups']
+        return {
+            'command': self.command,
+            'lang': self.target_col,
+            'timestamp': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'duration_seconds': round(time.time() - self.started, 6),
+            'rows_scanned': self.rows,
+            'rows_per_second': round(self.rows / row_scan, 1) if row_scan else None,
+            'stage_seconds': {name: round(sec, 6) for name, sec in self.stages.items()},
+            'peak_rss_bytes': peak_rss_bytes(),
+            'glossary': self.glossary,
+            'dedup': {
+                'rows': self.translation_rows,
+                'distinct_pairs': self.translation_pairs,
+                'ratio': round(1 - self.translation_pairs / self.translation_rows, 6) if self.translation_rows else 0.0,
+            },
+            'cache': {
+                'standard_lookups': lookups,
+                'standard_hit_ratio': round(1 - cache_stats['standard_misses'] / lookups, 6) if lookups else None,
+                'width_table_entries': len(WIDTH_TABLE),
+                'fold_table_entries': len(FOLD_TABLE),
+            },
+            'issues_total': sum(issue_counter.values()),
+            'issues_by_priority': dict(priority_counter),
+            'issues_by_type': dict(issue_counter),
+            'issues_by_platform': dict(file_counter),
+            'issues': [{'type': t, 'priority': p, 'platform': f, 'count': n}
+                       for (t, p, f), n in sorted(self.issue_matrix.items())],
+            'gates': self.gates,
+        }
+
+    def to_prometheus(self, summary):
+        base = {'command': self.command, 'lang': self.target_col}
+        lines = []
+
+        def metric(name, help_text, samples):
+            samples = [(labels, value) for labels, value in samples if value is not None]
+            if not samples:
+                return
+            full = f'{METRICS_PREFIX}_{name}'
+            lines.append(f'# HELP {full} {help_text}')
+            lines.append(f'# TYPE {full} gauge')
+            for labels, value in samples:
+                lines.append(f'{full}{_metric_labels({**base, **labels})} {value}')
+
+        metric('last_run_timestamp_seconds', 'Start time of the last run.', [({}, round(self.started, 3))])
+        metric('run_duration_seconds', 'Wall time of the run.', [({}, summary['duration_seconds'])])
+        metric('rows_scanned', 'Rows scanned.', [({}, summary['rows_scanned'])])
+        metric('rows_per_second', 'Row-scan throughput.', [({}, summary['rows_per_second'])])
+        metric('stage_duration_seconds', 'Wall time per stage.',
+               [({'stage': name}, sec) for name, sec in summary['stage_seconds'].items()])
+        metric('peak_rss_bytes', 'Peak resident set size.', [({}, summary['peak_rss_bytes'])])
+        metric('glossary_entries', 'Glossary entries by kind.',
+               [({'kind': kind}, n) for kind, n in summary['glossary'].items()])
+        metric('translation_dedup_ratio', 'Share of rows repeating an existing (source, target) pair.',
+               [({}, summary['dedup']['ratio'])])
+        metric('cache_hit_ratio', 'Cache hit ratio.', [({'cache': 'standard'}, summary['cache']['standard_hit_ratio'])])
+        metric('issues', 'Issues by type, priority and platform.',
+               [({'type': i['type'], 'priority': i['priority'], 'platform': i['platform']}, i['count'])
+                for i in summary['issues']])
+        # 不用 issues_total：_total 后缀留给 counter，且会与 issues 指标族冲突
+        metric('issues_reported', 'Total issues across all types.', [({}, summary['issues_total'])])
+        metric('gate_passed', 'Deployment gate result (1 = pass).',
+               [({'gate': gate}, int(passed)) for gate, passed in summary['gates'].items()])
+        lines.append('# EOF')  # OpenMetrics 结束标记
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """path 为 .prom 文件；同名 .json 为摘要。返回写出的文件列表"""
+        json_path = metrics_json_path(path)
+        summary = self.summary()
+        write_atomic(json_path, json.dumps(summary, ensure_ascii=False, indent=2))
+        write_atomic(path, self.to_prometheus(summary))
+        return [path, json_path]
+
+# ============================================================
+# 11.6 流水线扫描（读取 → 检测 → 编码）
+# ============================================================
+# 三个阶段之间用有界队列连接（满了就阻塞上游，内存只随队列深度 × 批大小增长）：
+#   读取线程：逐文件流式解码（utf-8-sig）成行批次，不整表载入
+#   检测（主线程）：逐批 scan_rows，同时逐批累加 INCONSISTENCY / KEY_DIVERGENCE 聚合
+#   编码线程：把行内问题预先编码成 CSV 字段，排序后直接拼接写出
+# 任一阶段出错都会在主线程重新抛出；检测出错或 Ctrl+C 时通知读取线程停止并排空队列，不会卡死。
+PIPELINE_BATCH_SIZE = 2000
+PIPELINE_QUEUE_DEPTH = 4  # 每个队列最多缓存的批次数
+PIPELINE_PUT_TIMEOUT = 0.1  # 读取线程入队等待间隔（秒），期间检查停止信号
+_PIPELINE_END = object()
+
+def iter_row_batches(files, target_col, source_col, batch_size, shard=None):
+    """读取阶段：按批产出带 __source_file__ / __pos__ 的行；列校验与控制台输出同 read_scan_files
+    shard=(i, N) 时按全局行序号取模只保留第i片
+    """
+    total = 0
+    for file_idx, filepath in enumerate(files):
+        with csv_dict_reader(filepath) as reader:
+            fieldnames = reader.fieldnames
+
+            # 验证列名
+            if target_col not in fieldnames:
+                print(f"[ERROR] 文件 {filepath} 中未找到列 '{target_col}'")
+                print(f"  可用列: {fieldnames}")
+                continue
+            if source_col not in fieldnames:
+                print(f"[ERROR] 文件 {filepath} 中未找到列 '{source_col}'")
+                continue
+
+            batch = []
+            row_idx = -1
+            for row_idx, row in enumerate(reader):
+                if shard and (total + row_idx) % shard[1] != shard[0] - 1:
+                    continue
+                row['__source_file__'] = filepath
+                row['__pos__'] = (file_idx, row_idx)
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        total += row_idx + 1
+        print(f"  已读取: {filepath} ({row_idx + 1} 行)")
+
+    print(f"\n总计: {total} 行\n")
+
+def _pipeline_put(out_queue, item, stop):
+    """入队；队列满时每隔 PIPELINE_PUT_TIMEOUT 检查一次停止信号，已停止返回 False"""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=PIPELINE_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _pipeline_feed(items, out_queue, errors, stop):
+    try:
+        for item in items:
+            if not _pipeline_put(out_queue, item, stop):
+                break
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        items.close()
+        _pipeline_put(out_queue, _PIPELINE_END, stop)
+
+def _pipeline_drain(in_queue):
+    while True:
+        item = in_queue.get()
+        if item is _PIPELINE_END:
+            return
+        yield item
+
+def encode_issue_batch(issues, encoded):
+    """编码阶段：来源..建议修正 七个字段按问题清单格式（QUOTE_ALL）编码"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_ALL, lineterminator='')
+    for issue in issues:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow([issue['file'], issue['row_id'], issue['priority'], issue['type'],
+                         issue['lang_key'], issue['current'], issue['suggestion']])
+        encoded[id(issue)] = buf.getvalue()
+
+def _pipeline_encode(in_queue, encoded, errors, busy):
+    for issues in _pipeline_drain(in_queue):
+        if errors:
+            continue  # 出错后只排空队列，避免上游阻塞
+        start = time.perf_counter()
+        try:
+            encode_issue_batch(issues, encoded)
+        except BaseException as e:
+            errors.append(e)
+        busy[0] += time.perf_counter() - start
+
+def scan_pipeline(engine, files, batch_size=PIPELINE_BATCH_SIZE, shard=None, encode=True, metrics=None):
+    """流水线扫描，返回 (行数, 行内问题, source_translations, key_index, encoded)；encode=False 时 encoded 为 None"""
+    errors = []
+    stop = threading.Event()
+    row_queue = queue.Queue(PIPELINE_QUEUE_DEPTH)
+    batches = iter_row_batches(files, engine.target_col, engine.source_col, batch_size, shard)
+    reader = threading.Thread(target=_pipeline_feed, args=(batches, row_queue, errors, stop), daemon=True)
+    reader.start()
+
+    encoded = {} if encode else None
+    encode_busy = [0.0]
+    if encode:
+        issue_queue = queue.Queue(PIPELINE_QUEUE_DEPTH)
+        encoder = threading.Thread(target=_pipeline_encode, args=(issue_queue, encoded, errors, encode_busy),
+                                   daemon=True)
+        encoder.start()
+
+    row_count = 0
+    all_issues = []
+    source_translations = defaultdict(lambda: defaultdict(list))
+    key_index = {}
+    scan_busy = aggregate_busy = 0.0
+    try:
+        for rows in _pipeline_drain(row_queue):
+            if errors:
+                continue
+            row_count += len(rows)
+            start = time.perf_counter()
+            issues = list(engine.scan_rows(rows))
+            mid = time.perf_counter()
+            collect_translations(rows, engine.target_col, engine.source_col, source_translations)
+            collect_key_index(rows, engine.target_col, engine.source_col, engine.lang_key_col, key_index)
+            aggregate_busy += time.perf_counter() - mid
+            scan_busy += mid - start
+            all_issues.extend(issues)
+            if encode and issues:
+                issue_queue.put(issues)
+    finally:
+        # 正常结束时读取线程已退出；异常中断时通知其停止，并排空队列让阻塞中的入队返回
+        stop.set()
+        while reader.is_alive():
+            try:
+                row_queue.get(timeout=PIPELINE_PUT_TIMEOUT)
+            except queue.Empty:
+                pass
+        reader.join()
+        if encode:
+            issue_queue.put(_PIPELINE_END)
+            encoder.join()
+    if errors:
+        raise errors[0]
+
+    if metrics:
+        metrics.stages['row_scan'] = metrics.stages.get('row_scan', 0.0) + scan_busy
+        metrics.stages['aggregate'] = metrics.stages.get('aggregate', 0.0) + aggregate_busy
+        if encode:
+            metrics.stages['encode'] = metrics.stages.get('encode', 0.0) + encode_busy[0]
+    return row_count, all_issues, source_translations, key_index, encoded
+
+# ============================================================
+# 11.7 压缩输入与大文件行索引
+# ============================================================
+# .csv.gz / .csv.zst 按扩展名流式解压，不落地临时文件（.zst 需要 zstandard 包）。
+# 扫描走普通缓冲流式读取（实测 mmap 逐行读取并不更快，已不使用）。show / 审核工具按编号ID取行时，
+# 首次顺序读一遍记录每条记录的起始字节偏移，写出 {文件}.rowidx.json 行索引（按文件大小 + 修改时间校验，
+# 文件变了自动重建；目录不可写时索引只在本次内存中使用），之后按偏移直接 seek，不必重读整个文件。
+ROW_INDEX_SUFFIX = '.rowidx.json'
+ROW_INDEX_FORMAT = 'qa-row-index/1'
+UTF8_BOM = b'\xef\xbb\xbf'
+
+def open_csv(path, mode='r'):
+    """按扩展名打开CSV文本流（utf-8-sig）：.gz 用 gzip，.zst 用 zstandard，其余为普通文件"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8-sig', newline='')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f'读写 {path} 需要 zstandard 包（pip install zstandard）')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return open(path, mode, encoding='utf-8-sig', newline='')
+
+def _binary_lines(raw):
+    for line in iter(raw.readline, b''):
+        yield line.decode('utf-8')
+
+def _skip_bom(raw):
+    raw.seek(3 if raw.read(3) == UTF8_BOM else 0)
+
+class _IndexedDictReader(csv.DictReader):
+    """二进制文件上的 DictReader：记录每条记录的 (编号ID, 起始字节偏移)"""
+
+    def __init__(self, raw):
+        _skip_bom(raw)
+        super().__init__(_binary_lines(raw))
+        self.raw = raw
+        self.ids = []
+        self.offsets = []
+
+    def __next__(self):
+        self.fieldnames  # 先读表头
+        # 与 DictReader 一样跳过空行，偏移指向记录本身的第一行
+        while True:
+            start = self.raw.tell()  # csv.reader 不预读，tell() 即下一行的起点
+            line = self.raw.readline()
+            if not line or line.strip(b'\r\n'):
+                break
+        self.raw.seek(start)
+        row = super().__next__()
+        self.ids.append(str(row.get('编号ID', '')).strip())
+        self.offsets.append(start)
+        return row
+
+def _file_signature(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def save_row_index(path, ids, offsets):
+    size, mtime_ns = _file_signature(path)
+    payload = {'format': ROW_INDEX_FORMAT, 'size': size, 'mtime_ns': mtime_ns, 'ids': ids, 'offsets': offsets}
+    write_atomic(path + ROW_INDEX_SUFFIX, json.dumps(payload, ensure_ascii=False, separators=(',', ':')))
+
+def _first_offsets(ids, offsets):
+    """{编号ID: 字节偏移}（重复ID取第一条）"""
+    index = {}
+    for row_id, offset in zip(ids, offsets):
+        index.setdefault(row_id, offset)
+    return index
+
+def load_row_index(path):
+    """返回 {编号ID: 字节偏移}；索引不存在或已过期返回 None"""
+    try:
+        with open(path + ROW_INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get('format') != ROW_INDEX_FORMAT or \
+            (payload.get('size'), payload.get('mtime_ns')) != _file_signature(path):
+        return None
+    return _first_offsets(payload['ids'], payload['offsets'])
+
+def build_row_index(path):
+    """顺序读一遍建立行偏移索引并尽量写出 sidecar；写不出（如只读目录）时只返回内存中的索引"""
+    with open(path, 'rb') as raw:
+        reader = _IndexedDictReader(raw)
+        for _ in reader:
+            pass
+    try:
+        save_row_index(path, reader.ids, reader.offsets)
+    except OSError as e:
+        print(f"  [WARN] 行索引未保存: {path}{ROW_INDEX_SUFFIX} ({e})")
+    return _first_offsets(reader.ids, reader.offsets)
+
+@contextmanager
+def csv_dict_reader(path):
+    """按文件类型打开CSV，产出 csv.DictReader"""
+    with open_csv(path) as f:
+        yield csv.DictReader(f)
+
+def read_rows_by_id(path, row_ids):
+    """按编号ID取行，返回 {编号ID: row}；普通CSV用行偏移索引 seek（没有则先建索引），压缩文件顺序扫描"""
+    wanted = {str(r).strip() for r in row_ids}
+    found = {}
+    if path.endswith(('.gz', '.zst')):
+        with csv_dict_reader(path) as reader:
+            for row in reader:
+                row_id = str(row.get('编号ID', '')).strip()
+                if row_id in wanted and row_id not in found:
+                    found[row_id] = row
+        return found
+    if not os.path.getsize(path):
+        return found
+
+    index = load_row_index(path)
+    if index is None:
+        index = build_row_index(path)
+
+    with open(path, 'rb') as raw:
+        _skip_bom(raw)
+        fieldnames = next(csv.reader(_binary_lines(raw)), [])
+        for row_id in sorted(wanted & set(index), key=index.get):
+            raw.seek(index[row_id])
+            values = next(csv.reader(_binary_lines(raw)))
+            found[row_id] = dict(zip(fieldnames, values))
+    return found
+
+def run_show(files, row_ids, cols=None):
+    """按编号ID打印行（审核用）"""
+    for filepath in files:
+        found = read_rows_by_id(filepath, row_ids)
+        print(f"\n{get_file_label(filepath)} ({filepath}): 命中 {len(found)}/{len(set(row_ids))}")
+        for row_id in row_ids:
+            row = found.get(str(row_id).strip())
+            if row is None:
+                continue
+            print(f"  #{row_id}")
+            for col in cols or row:
+                print(f"    {col}: {row.get(col, '')}")
+
+# ============================================================
+# 11.8 监听模式（scan --watch）
+# ============================================================
+# 轮询目录内 CSV 的 (大小, mtime)，只重读变更文件；行内问题按行内容缓存，内容未变的行直接复用，
+# 只检测新增/改动的行。INCONSISTENCY / KEY_DIVERGENCE 按文件保存聚合，只重算聚合有变化的
+# 源文本 / 语言标识；每轮按文件、行的顺序拼装，结果与同顺序 --files 全量扫描一致
+WATCH_INTERVAL = 0.25  # 轮询间隔（秒）；文件大小/mtime 连续两次相同才读取，避免读到写了一半的文件
+WATCH_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+WATCH_EXCLUDE = ('问题清单', '增量报告', '抽样估计', '引擎差异', '_backup_原始')  # 本工具自己的输出
+
+def list_watch_files(watch_dir, names=None):
+    """{路径: (大小, mtime)}；names 非空时只看这些文件名。隐藏文件与本工具输出不计入"""
+    found = {}
+    for entry in os.scandir(watch_dir):
+        name = entry.name
+        if name.startswith('.') or not name.endswith(WATCH_SUFFIXES) or any(m in name for m in WATCH_EXCLUDE):
+            continue
+        if names and name not in names:
+            continue
+        if entry.is_file():
+            st = entry.stat()
+            found[entry.path] = (st.st_size, st.st_mtime_ns)
+    return found
+
+class _WatchedFile:
+    """监听中的单个文件：行、按行内容缓存的行内问题、本文件的跨行聚合"""
+
+    def __init__(self, signature, rows):
+        self.signature = signature
+        self.rows = rows
+        self.cache = {}          # {行内容: [问题字典]}
+        self.issues = []         # 本文件行内问题（行顺序）
+        self.translations = {}   # collect_translations 结果
+        self.keys = {}           # collect_key_index 结果
+
+def _changed_keys(old, new):
+    return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+class ScanWatcher:
+    """增量扫描状态：术语表与引擎常驻，每轮只处理变更的文件和行"""
+
+    def __init__(self, engine, watch_dir, names=None):
+        self.engine = engine
+        self.watch_dir = watch_dir
+        self.names = names
+        self.files = {}          # {路径: _WatchedFile}
+        self.order = []          # 文件顺序（决定 __pos__ 与问题顺序）
+        self.inconsistency = {}  # {源文本: (首次出现位置, 问题列表)}
+        self.divergence = {}     # {语言标识: (首次出现位置, 问题列表)}
+
+    def _row_key(self, row):
+        """scan_row 读取的全部字段；同文件内相同即检测结果相同"""
+        engine = self.engine
+        return (row.get('编号ID'), row.get(engine.source_col), row.get(engine.target_col),
+                row.get(engine.lang_key_col) if engine.lang_key_col else None)
+
+    def _read(self, path, signature):
+        try:
+            rows, fieldnames = read_csv_file(path)
+        except (OSError, ValueError, EOFError, csv.Error) as e:
+            print(f"  [WARN] 读取失败，下轮重试: {path} ({e})")
+            return None
+        missing = [col for col in (self.engine.target_col, self.engine.source_col) if col not in (fieldnames or [])]
+        if missing:
+            print(f"[ERROR] 文件 {path} 中未找到列 {missing}")
+            rows = []
+        return _WatchedFile(signature, rows)
+
+    def _index_file(self, state, file_idx, cache):
+        """按文件序号编排行位置，行内问题命中缓存则复用，否则检测；重建本文件聚合。返回检测行数"""
+        engine = self.engine
+        fresh, issues, rescanned = {}, [], 0
+        for row_idx, row in enumerate(state.rows):
+            row['__pos__'] = pos = (file_idx, row_idx)
+            key = self._row_key(row)
+            found = fresh.get(key)
+            if found is None:
+                found = cache.get(key)
+                if found is None:
+                    found = list(engine.scan_rows([row]))
+                    rescanned += 1
+                elif found and found[0]['pos'] != pos:
+                    found = [dict(issue, pos=pos) for issue in found]
+                fresh[key] = found
+            elif found and found[0]['pos'] != pos:
+                # 同文件内内容相同的重复行
+                found = [dict(issue, pos=pos) for issue in found]
+            issues.extend(found)
+        state.cache, state.issues = fresh, issues
+        state.translations = collect_translations(state.rows, engine.target_col, engine.source_col)
+        state.keys = collect_key_index(state.rows, engine.target_col, engine.source_col, engine.lang_key_col)
+        return rescanned
+
+    def _file_order(self):
+        if self.names:
+            by_name = {os.path.basename(path): path for path in self.files}
+            return [by_name[name] for name in self.names if name in by_name]
+        return sorted(self.files)
+
+    def _refresh_source(self, source):
+        merged, first = {}, None
+        for path in self.order:
+            for target, locations in self.files[path].translations.get(source, {}).items():
+                merged.setdefault(target, []).extend(locations)
+                first = first or locations[0][2]
+        if merged:
+            issues = cross_row_issues({source: merged}, {}, self.engine.terms, self.engine.overrides)
+            self.inconsistency[source] = (first, issues)
+        else:
+            self.inconsistency.pop(source, None)
+
+    def _refresh_key(self, lang_key):
+        platforms, first = {}, None
+        for path in self.order:
+            for platform, entry in self.files[path].keys.get(lang_key, {}).items():
+                if platform not in platforms:
+                    platforms[platform] = entry
+                    first = first or entry[4]
+        if platforms:
+            issues = cross_row_issues({}, {lang_key: platforms}, self.engine.terms, self.engine.overrides)
+            self.divergence[lang_key] = (first, issues)
+        else:
+            self.divergence.pop(lang_key, None)
+
+    def refresh(self, changed, removed=(), full=False):
+        """重读 changed {路径: 签名}、移除 removed；full=True 时清空行缓存全部重检（术语表变更）
+        返回 (检测行数, 实际读入的文件列表)"""
+        previous = {path: self.files[path] for path in [*changed, *removed] if path in self.files}
+        for path in removed:
+            self.files.pop(path, None)
+        loaded = []
+        for path, signature in changed.items():
+            state = self._read(path, signature)
+            if state is not None:
+                self.files[path] = state
+                loaded.append(path)
+
+        order = self._file_order()
+        reindex = full or order != self.order
+        self.order = order
+
+        # 只处理读入的文件；文件顺序变化或术语表变更时全部重新编排
+        rescanned = 0
+        sources, keys = set(), set()
+        for file_idx, path in enumerate(order):
+            state = self.files[path]
+            if path in loaded:
+                old = previous.get(path)
+            elif reindex:
+                old = state
+            else:
+                continue
+            old_translations, old_keys = (old.translations, old.keys) if old else ({}, {})
+            rescanned += self._index_file(state, file_idx, {} if full or not old else old.cache)
+            sources |= _changed_keys(old_translations, state.translations)
+            keys |= _changed_keys(old_keys, state.keys)
+        for path, old in previous.items():
+            if path not in self.files:
+                sources |= set(old.translations)
+                keys |= set(old.keys)
+        if full:
+            sources = {s for state in self.files.values() for s in state.translations} | set(self.inconsistency)
+            keys = {k for state in self.files.values() for k in state.keys} | set(self.divergence)
+        for source in sources:
+            self._refresh_source(source)
+        for lang_key in keys:
+            self._refresh_key(lang_key)
+        return rescanned, loaded
+
+    def issues(self):
+        """按全量扫描的顺序拼装：行内问题（文件、行顺序）→ INCONSISTENCY → KEY_DIVERGENCE，再排序"""
+        all_issues = [issue for path in self.order for issue in self.files[path].issues]
+        for cached in (self.inconsistency, self.divergence):
+            for _, issues in sorted(cached.values(), key=lambda v: v[0]):
+                all_issues.extend(issues)
+        all_issues = drop_covered_divergence(all_issues)
+        sort_issues(all_issues)
+        return all_issues
+
+    def row_count(self):
+        return sum(len(state.rows) for state in self.files.values())
+
+def write_watch_outputs(watcher, target_col, output_dir, compress=None, stats=None):
+    """原子重写问题清单与摘要 JSON，返回 (all_issues, counters, 问题清单路径)"""
+    all_issues = watcher.issues()
+    counters = count_issues(all_issues)
+    output_file = os.path.join(output_dir, f'{target_col}问题清单.csv' + (f'.{compress}' if compress else ''))
+    tmp = f'{output_file}.tmp{os.getpid()}' + (f'.{compress}' if compress else '')
+    write_issue_csv(all_issues, tmp)
+    os.replace(tmp, output_file)
+
+    issue_counter, priority_counter, file_counter = counters
+    summary = {
+        'updated': datetime.now().isoformat(timespec='seconds'),
+        'files': [os.path.basename(path) for path in watcher.order],
+        'rows': watcher.row_count(),
+        'issues': len(all_issues),
+        'by_priority': {p: priority_counter[p] for p in PRIORITY_ORDER},
+        'by_type': {t: issue_counter[t] for t in SUMMARY_TYPES if issue_counter[t]},
+        'by_file': dict(file_counter),
+        **(stats or {}),
+    }
+    write_atomic(os.path.join(output_dir, f'{target_col}扫描摘要.json'),
+                 json.dumps(summary, ensure_ascii=False, indent=2))
+    return all_issues, counters, output_file
+
+def run_watch(watch_dir, names, target_col, source_col, lang_key_col, terminology_file, output_dir,
+              fold_diacritics=False, compress=None, metrics_file=None, interval=WATCH_INTERVAL, max_rounds=None):
+    """监听目录：首轮全量扫描，之后每次有文件保存只增量重扫；Ctrl+C 退出
+    max_rounds 为增量轮数上限（嵌入调用/测试用，None 为一直监听）
+    """
+    print(f"\n{'='*50}")
+    print(f"交易所语言QA引擎 - 监听模式")
+    print(f"{'='*50}")
+    print(f"监听目录: {watch_dir}")
+    print(f"目标语言列: {target_col}")
+    print(f"术语表: {terminology_file}")
+    print(f"轮询间隔: {interval}s")
+    print(f"{'='*50}\n")
+
+    engine = QAEngine(target_col, source_col, lang_key_col, terminology_file, fold_diacritics=fold_diacritics)
+    watcher = ScanWatcher(engine, watch_dir, names)
+    terms_signature = _file_signature(terminology_file) if os.path.exists(terminology_file) else None
+
+    def one_round(changed, removed=(), full=False):
+        metrics = RunMetrics('watch', target_col)
+        metrics.record_glossary(watcher.engine)
+        start = time.perf_counter()
+        with metrics.stage('rescan'):
+            rescanned, loaded = watcher.refresh(changed, removed, full)
+        with metrics.stage('write'):
+            all_issues, counters, output_file = write_watch_outputs(
+                watcher, target_col, output_dir, compress,
+                {'changed_files': [os.path.basename(p) for p in [*loaded, *removed]], 'rescanned_rows': rescanned})
+        metrics.rows = watcher.row_count()
+        metrics.record_issues(all_issues, counters)
+        if metrics_file:
+            metrics.write(metrics_file)
+        return all_issues, counters, output_file, rescanned, loaded, time.perf_counter() - start
+
+    all_issues, counters, output_file, _, _, elapsed = one_round(list_watch_files(watch_dir, names))
+    print(f"首轮: {len(watcher.order)} 个文件, {watcher.row_count()} 行, 耗时 {elapsed:.2f}s")
+    print_scan_summary(len(all_issues), counters, output_file)
+    print("监听中（Ctrl+C 退出）...")
+
+    pending = {}
+    rounds = 0
+    try:
+        while max_rounds is None or rounds < max_rounds:
+            time.sleep(interval)
+            current = list_watch_files(watch_dir, names)
+            changed = {p: sig for p, sig in current.items()
+                       if p not in watcher.files or watcher.files[p].signature != sig}
+            ready = {p: sig for p, sig in changed.items() if pending.get(p) == sig}
+            removed = [p for p in watcher.files if p not in current]
+            pending = changed
+
+            full = False
+            if terminology_file and os.path.exists(terminology_file):
+                signature = _file_signature(terminology_file)
+                if signature != terms_signature:
+                    terms_signature = signature
+                    watcher.engine = QAEngine(target_col, source_col, lang_key_col, terminology_file,
+                                              fold_diacritics=fold_diacritics, verbose=False)
+                    print(f"[{datetime.now():%H:%M:%S}] 术语表已变更，重新加载并全量重检")
+                    full = True
+            if not ready and not removed and not full:
+                continue
+
+            all_issues, counters, output_file, rescanned, loaded, elapsed = one_round(ready, removed, full)
+            rounds += 1
+            issue_counter, priority_counter, file_counter = counters
+            names_changed = ', '.join(os.path.basename(p) for p in [*loaded, *removed]) or '-'
+            print(f"[{datetime.now():%H:%M:%S}] 变更: {names_changed} | 重检 {rescanned} 行 | "
+                  f"问题 {len(all_issues)} (P0 {priority_counter['P0']} / P1 {priority_counter['P1']} / "
+                  f"P2 {priority_counter['P2']}) | {elapsed:.2f}s")
+    except KeyboardInterrupt:
+        print("\n监听已停止")
+    return watcher
+
+# ============================================================
+# 12. 批量修正
+# ============================================================
+def _add_fix(fix_map, key, suggestion):
     # 同一行多条记录时，取最长的suggestion（完整句优先于单一术语）
-    fix_map = {}  # {(file_label, row_id): suggestion}
-    with open(issues_file, 'r', encoding='utf-8-sig', newline='') as f:
+    if suggestion and (key not in fix_map or len(suggestion) > len(fix_map[key])):
+        fix_map[key] = suggestion
+
+def load_fix_map(issues_file):
+    """读取问题清单CSV，返回 {(file_label, row_id): suggestion}"""
+    fix_map = {}
+    with open_csv(issues_file) as f:
         reader = csv.DictReader(f)
         for row in reader:
             suggestion = row.get('人工修正', '').strip() or row.get('建议修正', '').strip()
-            if suggestion:
-                key = (row['来源'], row['编号ID'])
-                if key not in fix_map or len(suggestion) > len(fix_map[key]):
-                    fix_map[key] = suggestion
+            _add_fix(fix_map, (row['来源'], row['编号ID']), suggestion)
+    return fix_map
+
+def run_fix(files, target_col, issues_file=None, store=None):
+    """根据问题清单（或SQLite问题库）批量修正CSV"""
+    print(f"\n{'='*50}")
+    print(f"批量修正")
+    print(f"{'='*50}\n")
+
+    if store:
+        with open_issue_store(store) as conn:
+            if issues_file:
+                imported, unmatched = store_import_decisions(conn, target_col, issues_file)
+                print(f"人工决定已导入问题库: {imported} 条")
+                if unmatched:
+                    print(f"[WARN] {unmatched} 条人工决定与问题库本轮问题对不上（清单不是最近一轮导出？），未导入")
+            fix_map = store_fix_map(conn, target_col)
+    else:
+        fix_map = load_fix_map(issues_file)
 
     print(f"修正映射: {len(fix_map)} 条\n")
 
@@ -858,33 +3028,33 @@ def run_fix(files, target_col, issues_file):
 
         # 读取并修正
         rows, fieldnames = read_csv_file(filepath)
-        modified = 0
-        skipped = 0
 
-        output_rows = []
-        for row in rows:
+        # 先套用修正映射，再整列清理全角标点（即使不在fix_map中也清理）
+        mapped = set()
+        column = []
+        abspath = os.path.abspath(filepath)
+        for i, row in enumerate(rows):
             row_id = str(row.get('编号ID', '')).strip()
-            key = (file_label, row_id)
-
+            # 问题库按 (源文件路径, 行序号) 定位；问题清单CSV只有 (来源, 编号ID)
+            key = (abspath, i, row_id) if store else (file_label, row_id)
             if key in fix_map:
-                row[target_col] = replace_fullwidth(fix_map[key])
-                modified += 1
+                mapped.add(i)
+                column.append(fix_map[key])
             else:
-                # 即使不在fix_map中，也清理全角标点
-                val = row.get(target_col, '')
-                cleaned = replace_fullwidth(val)
-                if cleaned != val:
-                    row[target_col] = cleaned
-                    modified += 1
-                else:
-                    skipped += 1
+                column.append(row.get(target_col, ''))
+        column, changed = normalize_fullwidth_column(column)
+
+        touched = mapped.union(changed)
+        for i in touched:
+            rows[i][target_col] = column[i]
+        modified = len(touched)
+        skipped = len(rows) - modified
 
-            # 移除内部标记
-            clean_row = {k: v for k, v in row.items() if k != '__source_file__'}
-            output_rows.append(clean_row)
+        # 移除内部标记
+        output_rows = [{k: v for k, v in row.items() if k != '__source_file__'} for row in rows]
 
-        # 写回
-        with open(filepath, 'w', encoding='utf-8-sig', newline='') as f:
+        # 写回（压缩文件按原格式写回）
+        with open_csv(filepath, 'w') as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
             writer.writeheader()
             for row in output_rows:
@@ -898,13 +3068,8 @@ def run_fix(files, target_col, issues_file):
 # ============================================================
 # 13. 验证
 # ============================================================
-def run_verify(files, target_col, source_col, lang_key_col, terminology_file, output_dir):
-    """修正后验证"""
-    print(f"\n{'='*50}")
-    print(f"验证")
-    print(f"{'='*50}\n")
-
-    # 列完整性验证
+def check_integrity(files, target_col, fail_fast=False):
+    """列完整性验证 V1-V4（对比备份文件），返回是否全部通过"""
     all_pass = True
 
     for filepath in files:
@@ -956,9 +3121,27 @@ def run_verify(files, target_col, source_col, lang_key_col, terminology_file, ou
         print(f"    V3 非目标列: {'PASS' if v3 else 'FAIL'}")
         print(f"    V4 编号ID: {'PASS' if v4 else 'FAIL'}")
 
+        if fail_fast and not all_pass:
+            break
+
+    return all_pass
+
+def run_verify(files, target_col, source_col, lang_key_col, terminology_file, output_dir, fold_diacritics=False,
+               metrics_file=None):
+    """修正后验证"""
+    metrics = RunMetrics('verify', target_col)
+    print(f"\n{'='*50}")
+    print(f"验证")
+    print(f"{'='*50}\n")
+
+    # 列完整性验证
+    with metrics.stage('integrity'):
+        all_pass = check_integrity(files, target_col)
+
     # 重新扫描
     print(f"\n重新扫描...")
-    issues, _ = run_scan(files, target_col, source_col, lang_key_col, terminology_file, output_dir)
+    issues, _ = run_scan(files, target_col, source_col, lang_key_col, terminology_file, output_dir,
+                         fold_diacritics=fold_diacritics, metrics=metrics)
 
     # 门禁检查
     p0_count = sum(1 for i in issues if i['priority'] == 'P0')
@@ -985,13 +3168,398 @@ def run_verify(files, target_col, source_col, lang_key_col, terminology_file, ou
     for gate, name, passed, detail in gates:
         status = 'PASS' if passed else 'FAIL'
         print(f"  {gate} {name}: {status} ({detail})")
+        metrics.gates[gate] = passed
 
     verdict = "SAFE TO DEPLOY" if all_gates_pass else "NOT SAFE TO DEPLOY"
     print(f"\nVERDICT: {verdict}")
     print(f"{'='*50}\n")
 
+    if metrics_file:
+        print(f"运行指标已输出: {', '.join(metrics.write(metrics_file))}\n")
+
     return all_gates_pass
 
+# ============================================================
+# 13.1 门禁模式（verify --gates-only [--fail-fast]）
+# ============================================================
+# CI 只需要结论：不排序、不写问题清单、不跑 P2 与跨行检测（都不影响门禁）。
+# --fail-fast 时按优先级分阶段：列完整性 → 只跑 P0 检测 → P0+P1 检测，任一门禁失败立即停止。
+GATES = [
+    ('Gate 1', '零致命问题'),
+    ('Gate 2', '零全角标点'),
+    ('Gate 3', '零中文残留'),
+    ('Gate 4', '零编码损坏'),
+    ('Gate 5', '术语一致性'),
+    ('Gate 6', '行列不变'),
+]
+GATE_REPORT_LIMIT = 5  # 每道门禁最多列出的问题行
+
+def gates_for_issue(priority, issue_type):
+    """问题命中的门禁序号（0起）"""
+    hit = []
+    if priority == 'P0':
+        hit.append(0)
+    if issue_type == 'FULLWIDTH_PUNCTUATION':
+        hit.append(1)
+    if issue_type in ('CONTAINS_CHINESE', 'CHINESE_FRAGMENT'):
+        hit.append(2)
+    if issue_type == 'MOJIBAKE':
+        hit.append(3)
+    if issue_type == 'TERMINOLOGY_MISMATCH':
+        hit.append(4)
+    return hit
+
+def run_gates(files, target_col, source_col, lang_key_col, terminology_file, fail_fast=False,
+              fold_diacritics=False, metrics_file=None):
+    """只计算门禁结论，返回是否 SAFE TO DEPLOY"""
+    metrics = RunMetrics('gates', target_col)
+    print(f"\n{'='*50}")
+    print(f"门禁验证{'（fail-fast）' if fail_fast else ''}")
+    print(f"{'='*50}\n")
+
+    counts = [0] * len(GATES)
+    offenders = [[] for _ in GATES]
+    evaluated = set()  # 已完整检测的门禁
+    with metrics.stage('integrity'):
+        integrity = check_integrity(files, target_col, fail_fast)
+    stopped = fail_fast and not integrity
+
+    if not stopped:
+        with metrics.stage('glossary'):
+            engine = QAEngine(target_col, source_col, lang_key_col, terminology_file, fold_diacritics=fold_diacritics)
+        metrics.record_glossary(engine)
+        with metrics.stage('read'):
+            all_rows = read_scan_files(files, target_col, source_col)
+        metrics.rows = len(all_rows)
+        row_scan_start = time.perf_counter()
+
+        # fail-fast：先只跑便宜的 P0 检测，P0 全部通过后再跑 P1
+        for max_priority in (('P0', 'P1') if fail_fast else ('P1',)):
+            for row in all_rows:
+                row_issues = engine.check_row(row, max_priority)
+                for priority, issue_type, current, suggestion, detail in row_issues:
+                    if max_priority == 'P1' and fail_fast and priority == 'P0':
+                        continue  # P0 阶段已全部通过
+                    for g in gates_for_issue(priority, issue_type):
+                        counts[g] += 1
+                        if len(offenders[g]) < GATE_REPORT_LIMIT:
+                            offenders[g].append((get_file_label(row['__source_file__']),
+                                                 str(row.get('编号ID', '')).strip(), issue_type, current))
+                if fail_fast and any(counts):
+                    stopped = True
+                    break
+            if stopped:
+                break
+            evaluated.update((0, 2, 3) if max_priority == 'P0' else (0, 1, 2, 3, 4))
+        if not stopped:  # 提前终止时没有完整的吞吐量
+            metrics.stages['row_scan'] = time.perf_counter() - row_scan_start
+
+    print(f"\n{'='*50}")
+    print(f"门禁报告")
+    print(f"{'='*50}")
+
+    for g, (gate, name) in enumerate(GATES):
+        if g == 5:
+            status, detail = ('PASS', '已验证') if integrity else ('FAIL', 'FAIL')
+        elif counts[g]:
+            status, detail = 'FAIL', f"{'≥' if stopped else ''}{counts[g]} 条"
+        elif g in evaluated:
+            status, detail = 'PASS', '0 条'
+        else:
+            status, detail = 'SKIP', '已提前终止'
+        print(f"  {gate} {name}: {status} ({detail})")
+        if status != 'SKIP':
+            metrics.gates[gate] = status == 'PASS'
+        for file_label, row_id, issue_type, current in offenders[g] if g < 5 else []:
+            print(f"      {file_label} #{row_id} {issue_type}: {current[:60]}")
+
+    all_gates_pass = integrity and not any(counts) and len(evaluated) == 5
+    verdict = "SAFE TO DEPLOY" if all_gates_pass else "NOT SAFE TO DEPLOY"
+    print(f"\nVERDICT: {verdict}")
+    print(f"{'='*50}\n")
+
+    if metrics_file:
+        print(f"运行指标已输出: {', '.join(metrics.write(metrics_file))}\n")
+    return all_gates_pass
+
+# ============================================================
+# 13.2 引擎差异对比（equiv）
+# ============================================================
+# 参考引擎（如 git show <rev>:qa_engine.py 导出的旧版本）与当前引擎在同一语料上逐行对比，
+# 比较字段 (priority, type, suggestion, detail)。只调用最早版本就有的接口
+# （load_terminology / load_override_terms / load_fragment_map / scan_row / check_inconsistency），
+# 任一历史版本都可作参考引擎；跨行检测只对比 INCONSISTENCY
+EQUIV_GENERATE = 2000        # 默认生成语料行数
+EQUIV_MINIMIZE_LIMIT = 5     # 最多缩减出的最小复现用例数
+EQUIV_REPORT_LIMIT = 10      # 控制台最多列出的差异行
+EQUIV_PLATFORMS = ['app.csv', 'h5.csv', 'web.csv', 'agent.csv']  # 生成语料轮流归属的平台（平台相关检测）
+EQUIV_NOISE = ['，', '。', '：', '！', '？', '…', '（', '）', '\u201c', '\u201d', '、', '  ', ' ', '\n',
+               '{0}', '{amount}', '%s', '%1$s', '<b>', '</b>', '<br>', '&nbsp;', 'Ã¡', '中文']
+EQUIV_CSV_HEADER = ['语料', '文件', '编号ID', '源文本', '译文', '仅参考引擎', '仅当前引擎', '最小复现']
+
+def load_reference_engine(path):
+    """按文件路径加载参考引擎模块（不要求 .py 后缀）"""
+    loader = importlib.machinery.SourceFileLoader('qa_engine_reference', path)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+class _EngineRunner:
+    """以各版本共有的接口驱动一个引擎模块；检测抛出的异常也记为一条结果参与对比"""
+
+    def __init__(self, module, terminology_file, target_col, source_col, lang_key_col):
+        self.module = module
+        self.target_col = target_col
+        self.source_col = source_col
+        self.lang_key_col = lang_key_col
+        with redirect_stdout(io.StringIO()):
+            self.terms = module.load_terminology(terminology_file)
+            self.overrides, self.forbidden = module.load_override_terms(terminology_file)
+            self.fragments = module.load_fragment_map(terminology_file)
+
+    def row_issues(self, row):
+        """单行检测结果 Counter{(priority, type, suggestion, detail)}"""
+        try:
+            found = self.module.scan_row(row, self.target_col, self.source_col, self.lang_key_col, self.terms,
+                                         self.overrides, self.forbidden, self.fragments,
+                                         row.get('__source_file__', ''))
+        except Exception as e:
+            return Counter([('ERROR', type(e).__name__, '', str(e))])
+        return Counter((priority, issue_type, suggestion, detail)
+                       for priority, issue_type, _current, suggestion, detail in found)
+
+    def cross_issues(self, rows):
+        """INCONSISTENCY 结果 {(文件, 编号ID): Counter}"""
+        result = defaultdict(Counter)
+        try:
+            found = self.module.check_inconsistency(rows, self.target_col, self.source_col, self.terms,
+                                                    self.overrides)
+        except Exception as e:
+            result[('', '')][('ERROR', type(e).__name__, '', str(e))] += 1
+            return result
+        for issue in found:
+            result[(issue['file'], issue['row_id'])][
+                (issue['priority'], issue['type'], issue['suggestion'], issue['detail'])] += 1
+        return result
+
+    def run(self, rows):
+        """整份语料检测，返回 ({(文件, 编号ID): Counter}, 耗时秒)"""
+        start = time.perf_counter()
+        result = defaultdict(Counter)
+        for row in rows:
+            result[equiv_row_key(row)] += self.row_issues(row)
+        for key, found in self.cross_issues(rows).items():
+            result[key] += found
+        return result, time.perf_counter() - start
+
+def equiv_row_key(row):
+    return row.get('__source_file__', ''), str(row.get('编号ID', '')).strip()
+
+def _equiv_row(row_id, source, target, lang_key, filepath, pos, target_col, source_col, lang_key_col):
+    row = {'编号ID': str(row_id), source_col: source, target_col: target, '__source_file__': filepath,
+           '__pos__': pos}
+    if lang_key_col:
+        row[lang_key_col] = lang_key
+    return row
+
+def _insert_text(text, token, rng):
+    i = rng.randint(0, len(text))
+    return text[:i] + token + text[i:]
+
+def _equiv_tokens(glossary):
+    """变异用片段：噪声 + 禁止术语 + 中文片段"""
+    terms, overrides, forbidden, fragments = glossary
+    return EQUIV_NOISE + [pattern for pattern, _, _ in WRONG_TERM_RULES] + list(forbidden) + list(fragments)
+
+def generate_corpus(glossary, count, rng, target_col, source_col, lang_key_col):
+    """按术语表生成语料：标准译文 / 大小写变体 / 禁止术语 / 中文原文 / 空译文，叠加标点、占位符、标签等噪声
+    同一源文本反复出现，覆盖 INCONSISTENCY"""
+    terms, overrides, forbidden, fragments = glossary
+    pairs = list(overrides.items()) + list(terms.items()) or [('确认', 'OK')]
+    tokens = _equiv_tokens(glossary)
+    rows = []
+    for i in range(count):
+        j = rng.randrange(len(pairs))
+        source, standard = pairs[j]
+        target = rng.choice([standard, standard, standard.lower(), standard.upper(), source, '',
+                             rng.choice(tokens)])
+        for _ in range(rng.randint(0, 3)):
+            target = _insert_text(target, rng.choice(tokens), rng)
+        if rng.random() < 0.3:
+            source = _insert_text(source, rng.choice(EQUIV_NOISE), rng)
+        platform = i % len(EQUIV_PLATFORMS)
+        rows.append(_equiv_row(i + 1, source, target, f'gen_{j}', EQUIV_PLATFORMS[platform], (platform, i),
+                               target_col, source_col, lang_key_col))
+    return rows
+
+def mutate_text(text, rng, tokens):
+    """随机一处变异：插入片段 / 删一个字符 / 翻转一个字符大小写 / 整体换成片段"""
+    op = rng.randrange(4)
+    if op == 0 or not text:
+        return _insert_text(text, rng.choice(tokens), rng)
+    i = rng.randrange(len(text))
+    if op == 1:
+        return text[:i] + text[i + 1:]
+    if op == 2:
+        return text[:i] + text[i].swapcase() + text[i + 1:]
+    return rng.choice(tokens)
+
+def mutate_corpus(rows, glossary, count, rng, target_col):
+    """真实形态语料：抽取真实行，译文做 1~2 处变异（保留原文件、编号ID、语言标识）"""
+    tokens = _equiv_tokens(glossary)
+    mutants = []
+    for row in rng.sample(rows, min(count, len(rows))):
+        row = dict(row)
+        target = row.get(target_col) or ''
+        for _ in range(rng.randint(1, 2)):
+            target = mutate_text(target, rng, tokens)
+        row[target_col] = target
+        mutants.append(row)
+    return mutants
+
+def _ddmin(items, failing):
+    """缩减 items（列表或字符串），保持 failing(items) 为真，尽量删去更多元素"""
+    n = 2
+    while len(items) >= 2:
+        chunk = max(len(items) // n, 1)
+        for start in range(0, len(items), chunk):
+            candidate = items[:start] + items[start + chunk:]
+            if candidate and failing(candidate):
+                items = candidate
+                n = max(n - 1, 2)
+                break
+        else:
+            if chunk == 1:
+                break
+            n = min(n * 2, len(items))
+    return items
+
+def _divergence_signature(ref_only, cur_only):
+    """差异特征：仅参考引擎、仅当前引擎两侧各自的 {(type, detail)}"""
+    return ({(issue_type, detail) for _, issue_type, _, detail in ref_only},
+            {(issue_type, detail) for _, issue_type, _, detail in cur_only})
+
+def minimize_divergence(reference, current, rows, key, ref_only, cur_only, target_col, source_col):
+    """把差异缩减为最小复现：单行即可复现时依次缩减译文、源文本；否则缩减参与 INCONSISTENCY 的行集合
+    缩减过程始终保持原差异（两侧 (type, detail) 集合不变），不会漂移成另一处无关差异
+    """
+    row = next(r for r in rows if equiv_row_key(r) == key)
+    signature = _divergence_signature(ref_only, cur_only)
+
+    def reproduces(subset):
+        ref_found, cur_found = Counter(), Counter()
+        for candidate in subset:
+            if equiv_row_key(candidate) == key:
+                ref_found += reference.row_issues(candidate)
+                cur_found += current.row_issues(candidate)
+        if len(subset) > 1:  # 单行不构成跨行差异
+            ref_found += reference.cross_issues(subset).get(key, Counter())
+            cur_found += current.cross_issues(subset).get(key, Counter())
+        return _divergence_signature(ref_found - cur_found, cur_found - ref_found) == signature
+
+    if reproduces([row]):
+        row = dict(row)
+        for col in (target_col, source_col):
+            if row.get(col):
+                row[col] = _ddmin(row[col], lambda text: reproduces([{**row, col: text}]))
+        return [row]
+
+    source = str(row.get(source_col, '')).strip()
+    related = [r for r in rows if str(r.get(source_col, '')).strip() == source]
+    return _ddmin(related if reproduces(related) else rows, reproduces)
+
+def compare_results(reference_result, current_result):
+    """逐行对比，返回 [((文件, 编号ID), 仅参考引擎, 仅当前引擎)]"""
+    diverged = []
+    for key in sorted(set(reference_result) | set(current_result)):
+        ref_found = reference_result.get(key, Counter())
+        cur_found = current_result.get(key, Counter())
+        if ref_found != cur_found:
+            diverged.append((key, ref_found - cur_found, cur_found - ref_found))
+    return diverged
+
+def _cjk_pad(text, width, right=False):
+    """按显示宽度补齐（中文占两列）"""
+    pad = ' ' * max(width - int(display_width(text)), 0)
+    return pad + text if right else text + pad
+
+def _format_found(found):
+    return ' | '.join(f'{priority} {issue_type} → {suggestion} ({detail})' if suggestion else
+                      f'{priority} {issue_type} ({detail})'
+                      for (priority, issue_type, suggestion, detail), n in sorted(found.items())
+                      for _ in range(n))
+
+def run_equivalence(reference_file, files, target_col, source_col, lang_key_col, terminology_file, output_dir,
+                    generate=EQUIV_GENERATE, mutants=None, seed=None):
+    """参考引擎与当前引擎差异对比，返回是否完全一致"""
+    print(f"\n{'='*50}")
+    print(f"引擎差异对比: {target_col}")
+    print(f"参考引擎: {reference_file}")
+    print(f"{'='*50}\n")
+
+    reference = _EngineRunner(load_reference_engine(reference_file), terminology_file, target_col, source_col,
+                              lang_key_col)
+    current = _EngineRunner(sys.modules[__name__], terminology_file, target_col, source_col, lang_key_col)
+    glossary = (current.terms, current.overrides, current.forbidden, current.fragments)
+    rng = random.Random(seed)
+
+    corpora = []
+    if files:
+        real_rows = read_scan_files(files, target_col, source_col)
+        corpora.append(('真实', real_rows))
+        corpora.append(('真实变异', mutate_corpus(real_rows, glossary, len(real_rows) if mutants is None else mutants,
+                                               rng, target_col)))
+    if generate:
+        corpora.append(('生成', generate_corpus(glossary, generate, rng, target_col, source_col, lang_key_col)))
+
+    print(_cjk_pad('语料', 10) + ''.join(_cjk_pad(label, width, right=True) for label, width in
+                                         (('行数', 8), ('参考引擎', 10), ('当前引擎', 10), ('加速比', 8), ('差异行', 8))))
+    divergences = []
+    for name, rows in corpora:
+        reference_result, reference_secs = reference.run(rows)
+        current_result, current_secs = current.run(rows)
+        diverged = compare_results(reference_result, current_result)
+        divergences.extend((name, rows, d) for d in diverged)
+        speedup = f'{reference_secs / current_secs:.2f}x' if current_secs else '-'
+        print(f"{_cjk_pad(name, 10)}{len(rows):>8}{reference_secs:>9.2f}s{current_secs:>9.2f}s{speedup:>8}{len(diverged):>8}")
+
+    records = []
+    for i, (name, rows, (key, ref_only, cur_only)) in enumerate(divergences):
+        row = next(r for r in rows if equiv_row_key(r) == key) if key != ('', '') else {}
+        repro = ''
+        if row and i < EQUIV_MINIMIZE_LIMIT:
+            repro = json.dumps([[str(r.get(source_col, '')), str(r.get(target_col, ''))]
+                                for r in minimize_divergence(reference, current, rows, key, ref_only, cur_only,
+                                                             target_col, source_col)],
+                               ensure_ascii=False)
+        records.append([name, get_file_label(key[0]), key[1], str(row.get(source_col, '')),
+                        str(row.get(target_col, '')), _format_found(ref_only), _format_found(cur_only), repro])
+
+    if not records:
+        print(f"\n结论: 一致（{sum(len(rows) for _, rows in corpora)} 行）")
+        print(f"{'='*50}\n")
+        return True
+
+    output_file = os.path.join(output_dir, f'{target_col}引擎差异.csv')
+    with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(EQUIV_CSV_HEADER)
+        writer.writerows(records)
+
+    print(f"\n结论: 不一致（{len(records)} 行有差异）")
+    for name, label, row_id, source, target, ref_only, cur_only, repro in records[:EQUIV_REPORT_LIMIT]:
+        print(f"\n  [{name}] {label} #{row_id}  {source} → {target}")
+        print(f"    仅参考引擎: {ref_only or '-'}")
+        print(f"    仅当前引擎: {cur_only or '-'}")
+        if repro:
+            print(f"    最小复现: {repro}")
+    if len(records) > EQUIV_REPORT_LIMIT:
+        print(f"\n  ... 其余 {len(records) - EQUIV_REPORT_LIMIT} 行见差异报告")
+    print(f"\n差异报告已输出: {output_file}")
+    print(f"{'='*50}\n")
+    return False
+
 # ============================================================
 # 14. CLI入口
 # ============================================================
@@ -1006,14 +3574,51 @@ def main():
     scan_parser.add_argument('--lang-key', default='语言标识', help='语言标识列名')
     scan_parser.add_argument('--terms', help='术语表文件路径（默认自动查找）')
     scan_parser.add_argument('--output', default='.', help='输出目录')
-    scan_parser.add_argument('--files', nargs='+', required=True, help='CSV文件列表')
+    scan_parser.add_argument('--files', nargs='+', help='CSV文件列表（--watch 时为只监听这些文件名，按此顺序）')
+    scan_parser.add_argument('--watch', metavar='DIR', help='监听目录：文件保存后增量重扫并原子重写问题清单与摘要')
+    scan_parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, metavar='SEC',
+                             help=f'--watch 轮询间隔（默认 {WATCH_INTERVAL}s）')
+    scan_parser.add_argument('--shard', type=parse_shard, help='分片扫描 i/N（如 1/4），输出分片结果供 merge 合并')
+    scan_parser.add_argument('--db', help='SQLite问题库路径（写入本轮问题并沿用人工决定）')
+    scan_parser.add_argument('--baseline', nargs='+', help='上一版本导出CSV：只扫描变更行并输出增量报告')
+    sample_group = scan_parser.add_mutually_exclusive_group()
+    sample_group.add_argument('--sample', type=int, metavar='N', help='抽样快速扫描：分层抽取 N 行，输出问题占比估计')
+    sample_group.add_argument('--sample-rate', type=float, metavar='R', help='抽样快速扫描：按比例抽样（如 0.01）')
+    scan_parser.add_argument('--seed', type=int, help='抽样随机种子（便于复现）')
+    scan_parser.add_argument('--compress', choices=['gz', 'zst'], help='问题清单压缩输出（.csv.gz / .csv.zst）')
+    scan_parser.add_argument('--batch-size', type=int, default=PIPELINE_BATCH_SIZE, metavar='N',
+                             help=f'流水线每批行数（默认 {PIPELINE_BATCH_SIZE}）')
+    scan_parser.add_argument('--metrics', metavar='PROM_FILE',
+                             help='输出运行指标：Prometheus 文本（如 qa_越语.prom）+ 同名 .json 摘要')
+    scan_parser.add_argument('--fold-diacritics', action='store_true',
+                             help='禁止术语按去声调折叠匹配（捕获丢声调、NFD/NFC 不一致的译文）')
+    scan_parser.add_argument('--tm', nargs='?', type=float, const=TM_MIN_SCORE, metavar='MIN_SCORE',
+                             help=f'翻译记忆建议：为空/未翻译/中文行推荐相似源文本的现有译文（默认相似度 ≥ {TM_MIN_SCORE}）')
 
     # fix
     fix_parser = subparsers.add_parser('fix', help='批量修正')
     fix_parser.add_argument('--lang', required=True, help='目标语言列名')
-    fix_parser.add_argument('--issues', required=True, help='问题清单CSV文件')
+    fix_parser.add_argument('--issues', help='问题清单CSV文件（与 --db 同用时导入其中的人工决定）')
+    fix_parser.add_argument('--db', help='SQLite问题库路径（直接从问题库读取修正）')
     fix_parser.add_argument('--files', nargs='+', required=True, help='CSV文件列表')
 
+    # merge
+    merge_parser = subparsers.add_parser('merge', help='合并分片扫描结果')
+    merge_parser.add_argument('--lang', required=True, help='目标语言列名')
+    merge_parser.add_argument('--terms', help='术语表文件路径')
+    merge_parser.add_argument('--output', default='.', help='输出目录')
+    merge_parser.add_argument('--parts', nargs='+', required=True, help='分片结果文件列表')
+    merge_parser.add_argument('--db', help='SQLite问题库路径')
+    merge_parser.add_argument('--compress', choices=['gz', 'zst'], help='问题清单压缩输出')
+    merge_parser.add_argument('--tm', nargs='?', type=float, const=TM_MIN_SCORE, metavar='MIN_SCORE',
+                              help='翻译记忆建议（同 scan --tm）')
+
+    # show
+    show_parser = subparsers.add_parser('show', help='按编号ID查看行（大文件用行偏移索引直接定位）')
+    show_parser.add_argument('--files', nargs='+', required=True, help='CSV文件列表（支持 .csv.gz / .csv.zst）')
+    show_parser.add_argument('--ids', nargs='+', required=True, help='编号ID列表')
+    show_parser.add_argument('--cols', nargs='+', help='只显示这些列')
+
     # verify
     verify_parser = subparsers.add_parser('verify', help='验证')
     verify_parser.add_argument('--lang', required=True, help='目标语言列名')
@@ -1022,6 +3627,26 @@ def main():
     verify_parser.add_argument('--terms', help='术语表文件路径')
     verify_parser.add_argument('--output', default='.', help='输出目录')
     verify_parser.add_argument('--files', nargs='+', required=True, help='CSV文件列表')
+    verify_parser.add_argument('--fold-diacritics', action='store_true', help='禁止术语按去声调折叠匹配')
+    verify_parser.add_argument('--gates-only', action='store_true',
+                               help='只计算门禁结论（不输出问题清单），退出码 0=通过 1=未通过')
+    verify_parser.add_argument('--fail-fast', action='store_true', help='任一门禁失败立即停止（需 --gates-only）')
+    verify_parser.add_argument('--metrics', metavar='PROM_FILE', help='输出运行指标（同 scan --metrics）')
+
+    # equiv
+    equiv_parser = subparsers.add_parser('equiv', help='参考引擎与当前引擎差异对比（改写检测逻辑前后）')
+    equiv_parser.add_argument('--lang', required=True, help='目标语言列名')
+    equiv_parser.add_argument('--source', default='简体中文', help='源语言列名')
+    equiv_parser.add_argument('--lang-key', default='语言标识', help='语言标识列名')
+    equiv_parser.add_argument('--terms', help='术语表文件路径')
+    equiv_parser.add_argument('--output', default='.', help='输出目录')
+    equiv_parser.add_argument('--reference', required=True,
+                              help='参考引擎文件（如 git show <rev>:qa_engine.py > qa_engine_old.py）')
+    equiv_parser.add_argument('--files', nargs='+', help='真实语料CSV（同时生成其变异语料）')
+    equiv_parser.add_argument('--generate', type=int, default=EQUIV_GENERATE, metavar='N',
+                              help=f'按术语表生成 N 行语料（默认 {EQUIV_GENERATE}，0=不生成）')
+    equiv_parser.add_argument('--mutants', type=int, metavar='N', help='真实变异语料行数（默认与真实语料相同）')
+    equiv_parser.add_argument('--seed', type=int, help='语料随机种子（便于复现）')
 
     args = parser.parse_args()
 
@@ -1029,24 +3654,71 @@ def main():
         parser.print_help()
         return
 
-    # 自动查找术语表
-    SKILL_DIR = os.path.expanduser('~/.claude/skills/交易所语言QA')
-
-    if args.command in ('scan', 'verify'):
-        terms_file = args.terms
-        if not terms_file:
-            # 根据列名猜测语言
-            lang_map = {'越语': '越南语', '韩语': '韩语', '日语': '日语', '英语': '英语', '泰语': '泰语'}
-            lang_name = lang_map.get(args.lang, args.lang)
-            terms_file = os.path.join(SKILL_DIR, '术语表', f'{lang_name}.md')
-
-        if args.command == 'scan':
-            run_scan(args.files, args.lang, args.source, args.lang_key, terms_file, args.output)
+    if getattr(args, 'metrics', None):
+        try:
+            metrics_json_path(args.metrics)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # .zst 需要 zstandard：参数校验阶段就报错，不要等扫描完写出时才失败
+    if zstandard is None:
+        paths = [*(getattr(args, 'files', None) or []), *(getattr(args, 'baseline', None) or []),
+                 getattr(args, 'issues', None) or '']
+        if getattr(args, 'compress', None) == 'zst' or any(path.endswith('.zst') for path in paths):
+            parser.error('.zst 压缩读写需要 zstandard 包（pip install zstandard）')
+
+    if args.command in ('scan', 'verify', 'merge', 'equiv'):
+        # 未指定 --terms 时根据列名自动查找术语表
+        terms_file = args.terms or default_terminology_file(args.lang)
+
+        if args.command == 'scan' and args.watch:
+            if args.shard or args.db or args.baseline or args.tm is not None or args.sample or args.sample_rate:
+                parser.error('--watch 不能与 --shard / --db / --baseline / --tm / --sample 同时使用')
+            run_watch(args.watch, args.files, args.lang, args.source, args.lang_key, terms_file, args.output,
+                      args.fold_diacritics, args.compress, args.metrics, args.interval)
+        elif args.command == 'scan' and not args.files:
+            parser.error('scan 需要 --files（或 --watch DIR）')
+        elif args.command == 'equiv':
+            equal = run_equivalence(args.reference, args.files, args.lang, args.source, args.lang_key, terms_file,
+                                    args.output, args.generate, args.mutants, args.seed)
+            sys.exit(0 if equal else 1)
+        elif args.command == 'scan' and args.baseline:
+            if args.shard or args.db or args.tm is not None or args.sample or args.sample_rate or args.compress \
+                    or args.metrics:
+                parser.error('--baseline 不能与 --shard / --db / --tm / --sample / --compress / --metrics 同时使用')
+            run_delta_scan(args.files, args.baseline, args.lang, args.source, args.lang_key, terms_file,
+                           args.output, args.fold_diacritics)
+        elif args.command == 'scan' and (args.sample is not None or args.sample_rate is not None):
+            if args.shard or args.db or args.tm is not None or args.compress or args.metrics:
+                parser.error('--sample / --sample-rate 不能与 --shard / --db / --tm / --compress / --metrics 同时使用')
+            if args.sample is not None and args.sample < 1 or \
+                    args.sample_rate is not None and not 0 < args.sample_rate <= 1:
+                parser.error('--sample 须 ≥ 1，--sample-rate 须在 (0, 1] 内')
+            run_sample_scan(args.files, args.lang, args.source, args.lang_key, terms_file, args.output,
+                            args.sample, args.sample_rate, args.seed, args.fold_diacritics)
+        elif args.command == 'scan':
+            run_scan(args.files, args.lang, args.source, args.lang_key, terms_file, args.output,
+                     args.shard, args.db, args.tm, args.fold_diacritics, args.metrics, batch_size=args.batch_size,
+                     compress=args.compress)
+        elif args.command == 'merge':
+            run_merge(args.parts, terms_file, args.output, args.db, args.tm, args.compress)
+        elif args.gates_only:
+            passed = run_gates(args.files, args.lang, args.source, args.lang_key, terms_file,
+                               args.fail_fast, args.fold_diacritics, args.metrics)
+            sys.exit(0 if passed else 1)
         else:
-            run_verify(args.files, args.lang, args.source, args.lang_key, terms_file, args.output)
+            if args.fail_fast:
+                parser.error('--fail-fast 需要与 --gates-only 同时使用')
+            run_verify(args.files, args.lang, args.source, args.lang_key, terms_file, args.output,
+                       args.fold_diacritics, args.metrics)
+
+    elif args.command == 'show':
+        run_show(args.files, args.ids, args.cols)
 
     elif args.command == 'fix':
-        run_fix(args.files, args.lang, args.issues)
+        if not args.issues and not args.db:
+            parser.error('fix 需要 --issues 或 --db')
+        run_fix(args.files, args.lang, args.issues, args.db)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""qa_engine 回归测试（python -m pytest skills/交易所语言QA）"""
+
+import csv
+import gzip
+import os
+import random
+import sys
+import unicodedata
+from collections import defaultdict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import qa_engine  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GLOSSARY_FILE = os.path.join(HERE, '术语表', '越南语.md')
+PLATFORM_FILES = ('app.csv', 'h5.csv', 'web.csv', 'agent.csv')
+
+
+def _corpus_files(directory, count=400, seed=1):
+    """按术语表生成四个平台的语料CSV（部分译文为多行单元格），返回文件路径列表"""
+    engine = qa_engine.QAEngine('越语', terminology_file=GLOSSARY_FILE, verbose=False)
+    glossary = (engine.terms, engine.overrides, engine.forbidden, engine.fragments)
+    by_file = defaultdict(list)
+    for row in qa_engine.generate_corpus(glossary, count, random.Random(seed), '越语', '简体中文', '语言标识'):
+        by_file[row['__source_file__']].append(row)
+
+    paths = []
+    for name in PLATFORM_FILES:
+        path = os.path.join(str(directory), name)
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['编号ID', '语言标识', '简体中文', '越语'])
+            for i, row in enumerate(by_file[name]):
+                target = row['越语'] + ('\r\nDòng 2' if i % 25 == 0 else '')
+                writer.writerow([row['编号ID'], row['语言标识'], row['简体中文'], target])
+        paths.append(path)
+    return paths
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# ============================================================
+# 翻译记忆：倒排索引查询与暴力枚举一致
+# ============================================================
+def _tm_brute_force(tm, source, min_score):
+    """逐条计算 Dice，取最高分（同分取条目号小者）"""
+    entry = tm.exact.get(source)
+    if entry is not None:
+        return tm.targets[entry], 1.0, source
+    grams = tm._grams(source)
+    if not grams:
+        return None
+    best = None
+    for entry, other in enumerate(tm.grams):
+        score = 2 * len(grams & other) / (len(grams) + len(other))
+        if score >= min_score - qa_engine.TM_EPSILON and (best is None or (score, -entry) > best):
+            best = (score, -entry)
+    if best is None:
+        return None
+    return tm.targets[-best[1]], best[0], tm.sources[-best[1]]
+
+
+def test_tm_lookup_keeps_exact_threshold_match():
+    tm = qa_engine.TranslationMemory()
+    tm.add('用能发', 'A')
+    # 3 个 bigram 对 2 个，重叠 2：Dice = 2·2/(3+2) = 0.8，恰好等于阈值
+    assert tm.lookup('用能发可') == ('A', 0.8, '用能发')
+
+
+def test_tm_lookup_matches_brute_force():
+    rng = random.Random(7)
+    alphabet = '用能发可充值提现合约账户余额'
+
+    def text():
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 14)))
+
+    tm = qa_engine.TranslationMemory()
+    for i in range(600):
+        tm.add(text(), f't{i}')
+
+    for min_score in (0.5, 0.6, 0.7, qa_engine.TM_MIN_SCORE, 0.9):
+        for _ in range(400):
+            source = text()
+            assert tm.lookup(source, min_score) == _tm_brute_force(tm, source, min_score), (source, min_score)
+
+
+# ============================================================
+# QAEngine：默认术语表、按列检测接受任意可迭代对象
+# ============================================================
+def test_engine_resolves_default_glossary(monkeypatch):
+    monkeypatch.setattr(qa_engine, 'SKILL_DIR', os.path.dirname(os.path.abspath(__file__)))
+    engine = qa_engine.QAEngine('越语', verbose=False)
+    assert engine.terms
+
+
+def test_scan_columns_accepts_generators():
+    engine = qa_engine.QAEngine('越语', glossary=({'合约': 'Futures'}, {}, {}, {}), verbose=False)
+    sources = (s for s in ['合约', '合约'])
+    issues = engine.scan_columns(sources, iter(['Hợp đồng', 'Futures']), filepath='app.csv')
+    assert [(i['row_id'], i['type']) for i in issues] == [('0', 'TERMINOLOGY_MISMATCH')]
+
+    with pytest.raises(ValueError):
+        engine.scan_columns(iter(['合约', '合约']), iter(['Futures']))
+
+
+# ============================================================
+# 占位符词法：printf 占位符后不能紧跟字母数字
+# ============================================================
+def test_printf_placeholder_needs_trailing_boundary():
+    assert not qa_engine.tokenize_markup('50%sức mua')[0]
+    assert not qa_engine.tokenize_markup('%dx')[0]
+    assert qa_engine.tokenize_markup('Tổng %s.')[0] == {'%s': 1}
+    assert qa_engine.tokenize_markup('%1$s个%.2f')[0] == {'%1$s': 1, '%.2f': 1}
+
+
+# ============================================================
+# 门禁模式（max_priority）与完整扫描结果一致
+# ============================================================
+def test_gate_mode_matches_full_scan():
+    engine = qa_engine.QAEngine('越语', glossary=({}, {}, {}, {}), verbose=False)
+    # WRONG_TERM 把「gấp U」改写为 USDT，改写后的文本会多出 {USDT0} 占位符
+    row = {'简体中文': '合约', '越语': 'Fu{gấp U0}<b>tures', '编号ID': '1', '__source_file__': 'app.csv'}
+    full = [(p, t, d) for p, t, _, _, d in engine.check_row(row)]
+    for max_priority, kept in (('P0', {'P0'}), ('P1', {'P0', 'P1'})):
+        gated = [(p, t, d) for p, t, _, _, d in engine.check_row(row, max_priority)]
+        assert sorted(gated) == sorted(i for i in full if i[0] in kept), max_priority
+
+
+# ============================================================
+# SQLite问题库：同平台标签、同编号ID的两个文件各自回写
+# ============================================================
+def _write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        f.write('\r\n'.join(rows) + '\r\n')
+
+
+def _target_column(path):
+    return [row['越语'] for row in qa_engine.read_csv_file(str(path))[0]]
+
+
+def test_store_fix_keys_rows_by_file_and_position(tmp_path):
+    ios, android = tmp_path / 'app_ios.csv', tmp_path / 'app_android.csv'
+    _write_csv(ios, ['编号ID,语言标识,简体中文,越语', '1,k1,合约,Hợp đồng tương lai'])
+    _write_csv(android, ['编号ID,语言标识,简体中文,越语', '1,k2,充值成功,nạp tiền thành công'])
+    files = [str(ios), str(android)]
+    db, issues_csv = str(tmp_path / 'qa.db'), str(tmp_path / 'issues.csv')
+
+    engine = qa_engine.QAEngine('越语', glossary=({}, {}, {}, {}), verbose=False)
+    rows = qa_engine.read_scan_files(files, '越语', '简体中文')
+    engine.scan(rows, [qa_engine.store_sink(db, '越语'), qa_engine.csv_sink(issues_csv)])
+    assert {qa_engine.get_file_label(f) for f in files} == {'APP'}
+
+    qa_engine.run_fix(files, '越语', store=db)
+    assert _target_column(ios) == ['Futures']
+    assert _target_column(android) == ['Nạp tiền thành công']
+
+    # 人工修正按序号定位到对应文件的那一行
+    _write_csv(ios, ['编号ID,语言标识,简体中文,越语', '1,k1,合约,Hợp đồng tương lai'])
+    with qa_engine.open_csv(issues_csv) as f:
+        reviewed = list(csv.DictReader(f))
+    for row in reviewed:
+        row['人工修正'] = 'Hợp đồng' if row['语言标识'] == 'k1' else ''
+    with open(issues_csv, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=qa_engine.ISSUE_CSV_HEADER)
+        writer.writeheader()
+        writer.writerows(reviewed)
+    qa_engine.run_fix(files, '越语', issues_file=issues_csv, store=db)
+    assert _target_column(ios) == ['Hợp đồng']
+    assert _target_column(android) == ['Nạp tiền thành công']
+
+
+# ============================================================
+# 运行指标：缓存命中率按单次运行计算
+# ============================================================
+def test_run_metrics_cache_stats_are_per_run():
+    qa_engine.compile_standard('Futures (metrics test)')
+    metrics = qa_engine.RunMetrics()
+    assert metrics.summary()['cache']['standard_lookups'] == 0
+    qa_engine.compile_standard('Futures (metrics test)')
+    qa_engine.compile_standard('Hashrate (metrics test)')
+    cache = metrics.summary()['cache']
+    assert cache['standard_lookups'] == 2
+    assert cache['standard_hit_ratio'] == 0.5
+
+
+# ============================================================
+# 版本增量：删除行上的旧问题不算已修复
+# ============================================================
+def test_classify_delta_separates_deleted_rows():
+    def issue(row_id, issue_type):
+        return {'file': 'APP', 'row_id': row_id, 'type': issue_type}
+
+    old = [issue('1', 'WRONG_TERM'), issue('2', 'EMPTY'), issue('3', 'CAPITALIZATION')]
+    new = [issue('3', 'CAPITALIZATION'), issue('4', 'EMPTY')]
+    added, fixed, persisting, deleted = qa_engine.classify_delta(old, new, {('APP', '2')})
+    assert added == [issue('4', 'EMPTY')]
+    assert fixed == [issue('1', 'WRONG_TERM')]
+    assert persisting == [issue('3', 'CAPITALIZATION')]
+    assert deleted == [issue('2', 'EMPTY')]
+
+
+# ============================================================
+# 整列半角化：接受生成器
+# ============================================================
+def test_normalize_fullwidth_column_accepts_generator():
+    values, changed = qa_engine.normalize_fullwidth_column(v for v in ['Mua', 'Bán：', '（A）'])
+    assert values == ['Mua', 'Bán:', '(A)']
+    assert changed == [1, 2]
+
+
+# ============================================================
+# 分片扫描：各分片合并后与单机扫描一致
+# ============================================================
+def test_sharded_scan_merges_to_full_scan(tmp_path):
+    files = _corpus_files(tmp_path)
+    full, parts = tmp_path / 'full', tmp_path / 'parts'
+    full.mkdir()
+    parts.mkdir()
+    qa_engine.run_scan(files, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(full))
+    for i in (1, 2, 3):
+        qa_engine.run_scan(files, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(parts), shard=(i, 3))
+    qa_engine.run_merge([str(parts / f'越语问题清单.part{i}of3.json') for i in (1, 2, 3)], GLOSSARY_FILE,
+                        str(parts))
+    assert _read_bytes(parts / '越语问题清单.csv') == _read_bytes(full / '越语问题清单.csv')
+
+
+# ============================================================
+# 禁止术语：去声调 / NFD 折叠匹配
+# ============================================================
+def test_folded_wrong_term_matches_without_diacritics():
+    assert not qa_engine.check_wrong_term('Hop dong tuong lai', '合约')[0]
+    assert qa_engine.check_wrong_term_folded('Hop dong tuong lai', '合约') == \
+        (True, 'Futures', 'Hop dong tuong lai→Futures')
+
+
+def test_folded_wrong_term_maps_offsets_back_to_original():
+    # NFD 文本折叠后与原文长度不同：替换位置要映射回原文，其余部分原样保留（NFC）
+    target = unicodedata.normalize('NFD', 'Mở Hợp đồng tương lai ngay')
+    assert not qa_engine.check_wrong_term(target, '合约')[0]
+    assert qa_engine.check_wrong_term_folded(target, '合约') == \
+        (True, 'Mở Futures ngay', 'Hợp đồng tương lai→Futures')
+    assert qa_engine.check_wrong_term_folded('Mở HOP DONG TUONG LAI ngay', '合约')[1] == 'Mở Futures ngay'
+
+
+def test_fold_diacritics_scan_flags_toneless_term():
+    engine = qa_engine.QAEngine('越语', glossary=({}, {}, {}, {}), fold_diacritics=True, verbose=False)
+    plain = qa_engine.QAEngine('越语', glossary=({}, {}, {}, {}), verbose=False)
+    row = {'简体中文': '合约', '越语': 'Hop dong tuong lai', '编号ID': '1', '__source_file__': 'app.csv'}
+    assert [i[1] for i in engine.check_row(row)] == ['WRONG_TERM']
+    assert 'WRONG_TERM' not in [i[1] for i in plain.check_row(row)]
+
+
+# ============================================================
+# 跨行检测：已报 INCONSISTENCY 的行不再报 KEY_DIVERGENCE
+# ============================================================
+def test_key_divergence_dropped_on_inconsistent_rows():
+    engine = qa_engine.QAEngine('越语', terminology_file=GLOSSARY_FILE, verbose=False)
+    glossary = (engine.terms, engine.overrides, engine.forbidden, engine.fragments)
+    rows = list(qa_engine.generate_corpus(glossary, 400, random.Random(1), '越语', '简体中文', '语言标识'))
+    raw = qa_engine.key_divergence_from_index(
+        qa_engine.collect_key_index(rows, '越语', '简体中文', '语言标识'), engine.terms, engine.overrides)
+
+    cross = engine.cross_row_issues(rows)
+    flagged = {(i['filepath'], i['row_id']) for i in cross if i['type'] == 'INCONSISTENCY'}
+    kept = [(i['filepath'], i['row_id']) for i in cross if i['type'] == 'KEY_DIVERGENCE']
+    covered = [i for i in raw if (i['filepath'], i['row_id']) in flagged]
+    assert covered and kept
+    assert not flagged.intersection(kept)
+    assert len(kept) == len(raw) - len(covered)
+
+
+# ============================================================
+# 文本溢出：按平台预算检查，术语表标准翻译不报
+# ============================================================
+def test_text_overflow_budget_per_platform():
+    engine = qa_engine.QAEngine('越语', terminology_file=GLOSSARY_FILE, verbose=False)
+
+    def types(source, target, name):
+        row = {'简体中文': source, '越语': target, '编号ID': '1', '__source_file__': name}
+        return [issue[1] for issue in engine.check_row(row)]
+
+    # 标准译文本身超出 APP 预算（6列→22列），但不报
+    assert qa_engine.check_text_overflow('涨幅榜', 'Bảng xếp hạng tăng giá', 'APP')[0]
+    assert 'TEXT_OVERFLOW' not in types('涨幅榜', 'Bảng xếp hạng tăng giá', 'app.csv')
+    # 17.5列：超出 APP 下限16列，未超出代理后台下限20列
+    assert 'TEXT_OVERFLOW' in types('提交', 'Gửi yêu cầu ngay bây', 'app.csv')
+    assert 'TEXT_OVERFLOW' not in types('提交', 'Gửi yêu cầu ngay bây', 'agent.csv')
+    assert 'TEXT_OVERFLOW' in types('提交', 'Gửi yêu cầu xác nhận ngay bây giờ', 'agent.csv')
+
+
+# ============================================================
+# 流式扫描：--batch-size 不影响输出
+# ============================================================
+@pytest.mark.parametrize('batch_size', [1, 7, 2000])
+def test_batch_size_does_not_change_output(tmp_path, batch_size):
+    files = _corpus_files(tmp_path)
+    default, batched = tmp_path / 'default', tmp_path / 'batched'
+    default.mkdir()
+    batched.mkdir()
+    qa_engine.run_scan(files, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(default))
+    qa_engine.run_scan(files, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(batched), batch_size=batch_size)
+    assert _read_bytes(batched / '越语问题清单.csv') == _read_bytes(default / '越语问题清单.csv')
+
+
+# ============================================================
+# 压缩输入/输出与行偏移索引
+# ============================================================
+def test_gz_input_and_output_round_trip(tmp_path):
+    files = _corpus_files(tmp_path)
+    gz_files = []
+    for path in files:
+        with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+            dst.write(src.read())
+        gz_files.append(path + '.gz')
+    plain, packed = tmp_path / 'plain', tmp_path / 'packed'
+    plain.mkdir()
+    packed.mkdir()
+    qa_engine.run_scan(files, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(plain))
+    qa_engine.run_scan(gz_files, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(packed), compress='gz')
+
+    with qa_engine.open_csv(str(packed / '越语问题清单.csv.gz')) as f:
+        packed_text = f.read()
+    with qa_engine.open_csv(str(plain / '越语问题清单.csv')) as f:
+        assert packed_text == f.read()
+    assert qa_engine.read_csv_file(gz_files[0])[0][0]['越语'] == qa_engine.read_csv_file(files[0])[0][0]['越语']
+
+
+def test_row_index_handles_multiline_cells(tmp_path):
+    path = str(tmp_path / 'app.csv')
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        f.write('编号ID,简体中文,越语\r\n'
+                '1,充值,"Nạp tiền\r\nDòng 2"\r\n'
+                '\r\n'
+                '2,"提现\n说明",Rút tiền\r\n'
+                '3,划转,"Chuyển ""nội bộ""\r\n\r\nDòng 3"\r\n'
+                '4,合约,Futures')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        expected = {row['编号ID']: row for row in csv.DictReader(f)}
+
+    assert qa_engine.read_rows_by_id(path, ['4', '2', '9']) == {k: expected[k] for k in ('2', '4')}
+    assert os.path.exists(path + qa_engine.ROW_INDEX_SUFFIX)
+    # 第二次读取走 sidecar 索引，结果不变
+    assert qa_engine.read_rows_by_id(path, expected) == expected
+
+
+# ============================================================
+# 引擎差异对比与最小复现
+# ============================================================
+def _reference_copy(tmp_path):
+    """当前引擎的副本，仅把 WHITESPACE 的 detail 改掉，人为制造差异"""
+    with open(qa_engine.__file__, encoding='utf-8') as f:
+        source = f.read()
+    assert source.count("'空白问题'") == 1
+    path = str(tmp_path / 'qa_engine_ref.py')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(source.replace("'空白问题'", "'空白'"))
+    return path
+
+
+def test_equivalence_check_reports_divergence(tmp_path):
+    args = (None, '越语', '简体中文', '语言标识', GLOSSARY_FILE, str(tmp_path))
+    assert qa_engine.run_equivalence(qa_engine.__file__, *args, generate=300, seed=1)
+    assert not qa_engine.run_equivalence(_reference_copy(tmp_path), *args, generate=300, seed=1)
+    with open(tmp_path / '越语引擎差异.csv', encoding='utf-8-sig', newline='') as f:
+        records = list(csv.DictReader(f))
+    assert records and all('WHITESPACE' in r['仅参考引擎'] for r in records)
+    assert [bool(r['最小复现']) for r in records] == [i < qa_engine.EQUIV_MINIMIZE_LIMIT for i in range(len(records))]
+
+
+def test_minimized_divergence_keeps_signature(tmp_path):
+    reference = qa_engine._EngineRunner(qa_engine.load_reference_engine(_reference_copy(tmp_path)), GLOSSARY_FILE,
+                                        '越语', '简体中文', '语言标识')
+    current = qa_engine._EngineRunner(qa_engine, GLOSSARY_FILE, '越语', '简体中文', '语言标识')
+    glossary = (current.terms, current.overrides, current.forbidden, current.fragments)
+    rows = list(qa_engine.generate_corpus(glossary, 400, random.Random(1), '越语', '简体中文', '语言标识'))
+    diverged = qa_engine.compare_results(reference.run(rows)[0], current.run(rows)[0])
+    assert diverged
+
+    for key, ref_only, cur_only in diverged:
+        row = next(r for r in rows if qa_engine.equiv_row_key(r) == key)
+        minimized = qa_engine.minimize_divergence(reference, current, rows, key, ref_only, cur_only, '越语', '简体中文')
+        assert len(minimized) == 1
+        assert len(minimized[0]['越语']) <= len(row['越语'])
+        ref_found, cur_found = reference.row_issues(minimized[0]), current.row_issues(minimized[0])
+        assert qa_engine._divergence_signature(ref_found - cur_found, cur_found - ref_found) == \
+            qa_engine._divergence_signature(ref_only, cur_only)
+
+
+# ============================================================
+# 监听模式：首轮与增量重检后的输出与全量扫描一致
+# ============================================================
+def test_watch_output_matches_full_scan(tmp_path, monkeypatch):
+    data, watched, scanned = tmp_path / 'data', tmp_path / 'watched', tmp_path / 'scanned'
+    for d in (data, watched, scanned):
+        d.mkdir()
+    files = _corpus_files(data)
+    args = ('越语', '简体中文', '语言标识', GLOSSARY_FILE)
+
+    qa_engine.run_watch(str(data), None, *args, str(watched), interval=0, max_rounds=0)
+    qa_engine.run_scan(files, *args, str(scanned))
+    assert _read_bytes(watched / '越语问题清单.csv') == _read_bytes(scanned / '越语问题清单.csv')
+
+    # 监听期间改写 app.csv：删掉一半行、改一处译文
+    rows, fieldnames = qa_engine.read_csv_file(files[0])
+    rows = rows[::2]
+    rows[0]['越语'] = '  Hop dong  '
+    edited = []
+
+    def edit_once(_):
+        if not edited:
+            with open(files[0], 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+            edited.append(True)
+
+    monkeypatch.setattr(qa_engine.time, 'sleep', edit_once)
+    qa_engine.run_watch(str(data), None, *args, str(watched), interval=0, max_rounds=1)
+    qa_engine.run_scan(files, *args, str(scanned))
+    assert edited
+    assert _read_bytes(watched / '越语问题清单.csv') == _read_bytes(scanned / '越语问题清单.csv')